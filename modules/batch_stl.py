@@ -0,0 +1,518 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# ==============================================================================
+#                 BATCHED STL: SETTINGS SHARED WITH STATSMODELS
+# ==============================================================================
+
+## Upper bound on the elements of temporary (rows, positions, window) arrays ----
+MAX_BLOCK_ELEMENTS = 2**22
+
+
+def stl_settings(period, seasonal=7, trend=None, low_pass=None):
+    """
+    Validate STL smoother lengths and fill in the defaults used by
+    `statsmodels.tsa.seasonal.STL`.
+
+    Returns
+    A `(seasonal, trend, low_pass)` tuple of odd integers.
+    """
+
+    if int(period) != period or period < 2:
+        raise ValueError("period must be a positive integer >= 2")
+    if int(seasonal) != seasonal or seasonal < 3 or seasonal % 2 == 0:
+        raise ValueError("seasonal must be an odd positive integer >= 3")
+
+    if trend is None:
+        trend = int(np.ceil(1.5 * period / (1 - 1.5 / seasonal)))
+        trend += trend % 2 == 0
+    if int(trend) != trend or trend < 3 or trend % 2 == 0 or trend <= period:
+        raise ValueError(
+            "trend must be an odd positive integer >= 3 where trend > period"
+        )
+
+    if low_pass is None:
+        low_pass = period + 1
+        low_pass += low_pass % 2 == 0
+    if int(low_pass) != low_pass or low_pass < 3 or low_pass % 2 == 0 or low_pass <= period:
+        raise ValueError(
+            "low_pass must be an odd positive integer >= 3 where low_pass > period"
+        )
+
+    return int(seasonal), int(trend), int(low_pass)
+
+
+def mstl_settings(periods, seasonal=None, n=None):
+    """
+    Sort seasonal periods with their smoother lengths as in
+    `statsmodels.tsa.seasonal.MSTL`.
+
+    Parameters
+    ----------
+    periods: int or sequence of int
+        The seasonal periods, e.g. (7, 365) for daily data.
+
+    seasonal: int or sequence of int
+        Lengths of the seasonal smoothers: one per period, a single length
+        used for every period, or None for the MSTL defaults 11, 15, 19, ...
+
+    n: int
+        Length of the series. Periods of at least half of it are dropped, as
+        there are fewer than two full cycles to estimate them from.
+
+    Returns
+    A `(periods, seasonal)` tuple of equal-length tuples, by ascending period.
+    """
+
+    periods = tuple(int(p) for p in np.atleast_1d(periods))
+
+    if seasonal is None:
+        seasonal = tuple(7 + 4 * np.arange(1, len(periods) + 1))
+    elif np.ndim(seasonal) == 0:
+        seasonal = (seasonal,) * len(periods)
+    seasonal = tuple(int(s) for s in seasonal)
+
+    if len(periods) != len(seasonal):
+        raise ValueError("periods and seasonal must have the same length")
+
+    pairs = sorted(zip(periods, seasonal))
+    if n is not None:
+        pairs = [(p, s) for p, s in pairs if p < n / 2]
+    if not pairs:
+        raise ValueError("no seasonal period is shorter than half of the series")
+
+    return tuple(p for p, _ in pairs), tuple(s for _, s in pairs)
+
+
+# ==============================================================================
+#                       VECTORIZED LOESS BUILDING BLOCKS
+# ==============================================================================
+
+
+def _loess_weights(n, length, degree, x, left, rw=None):
+    """
+    Weights of local (degree 0 or 1) tricube regressions of series of length
+    `n` at positions `x`, each using the window of `min(length, n)` points
+    starting at `left`. Positions are 1-based as in the original Fortran.
+
+    Returns a `(weights, j, ok)` tuple: the fitted values of the rows of `y`
+    are `(weights * y[:, j - 1]).sum(axis=-1)`, valid where `ok`. `weights`
+    has one leading row per row of `rw`, or a single one without.
+    """
+
+    width = min(length, n)
+    j = left[:, None] + np.arange(width)
+
+    ### Tricube weights on the distance to the evaluation point ----
+    h = np.maximum(x - left, left + width - 1 - x)
+    if length > n:
+        h = h + (length - n) // 2
+    r = np.abs(j - x[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = np.where(
+            r <= 0.999 * h[:, None],
+            np.where(r <= 0.001 * h[:, None], 1.0, (1.0 - (r / h[:, None]) ** 3) ** 3),
+            0.0,
+        )[None, :, :]
+
+    ### Robustness weights differ per row ----
+    if rw is not None:
+        w = w * rw[:, j - 1]
+
+    total = w.sum(axis=-1)
+    ok = total > 0
+    w = w / np.where(ok, total, 1.0)[..., None]
+
+    ### Local linear correction ----
+    if degree > 0:
+        centre = (w * j).sum(axis=-1)
+        spread = (w * (j - centre[..., None]) ** 2).sum(axis=-1)
+        linear = (np.sqrt(spread) > 0.001 * (n - 1)) & (h > 0)
+        slope = np.where(linear, (x - centre) / np.where(linear, spread, 1.0), 0.0)
+        w = w * (slope[..., None] * (j - centre[..., None]) + 1.0)
+
+    return w, j, ok
+
+
+def _loess(y, length, degree, xs, nleft, rw=None):
+    """
+    Local regression of every row of `y` evaluated at positions `xs`, see
+    `_loess_weights()`.
+
+    Returns the `(rows, positions)` fitted values, NaN where all weights in the
+    window are zero.
+    """
+
+    rows, n = y.shape
+    width = min(length, n)
+    xs = np.asarray(xs, dtype="float64")
+    nleft = np.asarray(nleft, dtype="int64")
+    out = np.empty((rows, xs.size))
+
+    ## Evaluate positions in blocks to bound temporary memory ----
+    block = max(1, MAX_BLOCK_ELEMENTS // max(1, rows * width))
+
+    for start in range(0, xs.size, block):
+        w, j, ok = _loess_weights(
+            n, length, degree, xs[start : start + block], nleft[start : start + block], rw
+        )
+        fitted = (w * y[:, j - 1]).sum(axis=-1)
+        out[:, start : start + block] = np.where(ok, fitted, np.nan)
+
+    return out
+
+
+def _smooth(y, length, degree, rw=None):
+    """LOESS smoothing of every row of `y` at all of its points."""
+
+    rows, n = y.shape
+    if n < 2:
+        return y.copy()
+
+    positions = np.arange(1, n + 1)
+    if length >= n:
+        nleft = np.ones(n, dtype="int64")
+    else:
+        nleft = 1 + np.clip(positions - (length + 2) // 2, 0, n - length)
+
+    ## Points with a centred window share one tricube kernel, so their fits
+    ## reduce to moving weighted sums; only the edges need local fits ----
+    if length < n and length % 2 == 1:
+        half = length // 2
+
+        smoothed = np.empty((rows, n))
+        smoothed[:, half : n - half] = _kernel_smooth(y, length, degree, rw)
+
+        ### Without robustness weights an edge is the same filter for all rows ----
+        edges = np.r_[0:half, n - half : n]
+        if rw is None:
+            for edge, first in ((edges[:half], 0), (edges[half:], n - length)):
+                w, _, _ = _loess_weights(
+                    n, length, degree, positions[edge].astype("float64"), nleft[edge]
+                )
+                smoothed[:, edge] = y[:, first : first + length] @ w[0].T
+        else:
+            smoothed[:, edges] = _loess(y, length, degree, positions[edges], nleft[edges], rw)
+    else:
+        smoothed = _loess(y, length, degree, positions, nleft, rw)
+
+    return np.where(np.isnan(smoothed), y, smoothed)
+
+
+def _kernel_smooth(y, length, degree, rw=None):
+    """
+    Local (degree 0 or 1) tricube regression of every row of `y` at each point
+    with a centred window of `length` (odd) points, i.e. the fits of `_loess()`
+    at positions `length // 2 + 1` to `n - length // 2`.
+
+    The fits are computed from moving sums of the kernel moments. Without
+    robustness weights the kernel is symmetric, the linear term vanishes and
+    the fit is a plain moving weighted average.
+    """
+
+    half = length // 2
+    d = np.arange(-half, half + 1)
+    r = np.abs(d)
+    kernel = np.where(
+        r <= 0.999 * half,
+        np.where(r <= 0.001 * half, 1.0, (1.0 - (r / half) ** 3) ** 3),
+        0.0,
+    )
+
+    ## Blocks of rows bound the size of the windowed views' products ----
+    n_windows = y.shape[1] - length + 1
+    block = max(1, MAX_BLOCK_ELEMENTS // max(1, n_windows * length))
+
+    def moving_sums(x, weights):
+        windows = sliding_window_view(x, length, axis=1)
+        return np.concatenate(
+            [windows[start : start + block] @ weights for start in range(0, x.shape[0], block)]
+        )
+
+    if rw is None:
+        return moving_sums(y, kernel / kernel.sum())
+
+    ### Weighted sums of 1, d and d**2, and of y and y * d ----
+    moments = kernel[:, None] * d[:, None] ** np.arange(3)
+    s0, s1, s2 = np.moveaxis(moving_sums(rw, moments), -1, 0)
+    t0, t1 = np.moveaxis(moving_sums(rw * y, moments[:, :2]), -1, 0)
+
+    ok = s0 > 0
+    s0 = np.where(ok, s0, 1.0)
+    mean = t0 / s0
+    fitted = mean
+
+    ### Local linear correction, with the centre relative to the point ----
+    if degree > 0:
+        centre = s1 / s0
+        spread = np.maximum(s2 / s0 - centre**2, 0.0)
+        linear = np.sqrt(spread) > 0.001 * (y.shape[1] - 1)
+        slope = np.where(linear, -centre / np.where(linear, spread, 1.0), 0.0)
+        fitted = mean + slope * (t1 / s0 - centre * mean)
+
+    return np.where(ok, fitted, np.nan)
+
+
+def _moving_average(x, length):
+    """Moving average of `length` points along the rows of `x`."""
+
+    csum = np.cumsum(x, axis=1)
+    csum = np.concatenate([np.zeros((x.shape[0], 1)), csum], axis=1)
+
+    return (csum[:, length:] - csum[:, :-length]) / length
+
+
+def _cycle_subseries(y, period, seasonal, degree, rw=None):
+    """
+    Smooth every cycle-subseries of every row and extend each by one period at
+    both ends. Subseries of equal length are smoothed together.
+
+    Returns a `(rows, n + 2 * period)` array.
+    """
+
+    rows, n = y.shape
+    cycle = np.empty((rows, n + 2 * period))
+    lengths = (n - 1 - np.arange(period)) // period + 1
+
+    for k in np.unique(lengths):
+        cols = np.flatnonzero(lengths == k)
+        idx = cols[:, None] + period * np.arange(k)
+
+        ### Stack (row, subseries) pairs into one matrix ----
+        sub = y[:, idx].reshape(-1, k)
+        sub_rw = None if rw is None else rw[:, idx].reshape(-1, k)
+
+        smoothed = np.empty((sub.shape[0], k + 2))
+        smoothed[:, 1 : k + 1] = _smooth(sub, seasonal, degree, sub_rw)
+
+        ### Extrapolate one point before and after the subseries ----
+        first = _loess(sub, seasonal, degree, [0], [1], sub_rw)[:, 0]
+        last = _loess(sub, seasonal, degree, [k + 1], [max(1, k - seasonal + 1)], sub_rw)[:, 0]
+        smoothed[:, 0] = np.where(np.isnan(first), smoothed[:, 1], first)
+        smoothed[:, k + 1] = np.where(np.isnan(last), smoothed[:, k], last)
+
+        positions = cols[:, None] + period * np.arange(k + 2)
+        cycle[:, positions] = smoothed.reshape(rows, cols.size, k + 2)
+
+    return cycle
+
+
+def _robustness_weights(y, fit):
+    """Bisquare robustness weights of every row, as in STL's outer loop."""
+
+    n = y.shape[1]
+    r = np.abs(y - fit)
+    mid = sorted({n // 2, n - n // 2 - 1})
+    part = np.partition(r, mid, axis=1)
+    cmad = 3.0 * (part[:, n // 2] + part[:, n - n // 2 - 1])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = r / cmad[:, None]
+        rw = np.where(
+            r <= 0.001 * cmad[:, None],
+            1.0,
+            np.where(r <= 0.999 * cmad[:, None], (1.0 - u**2) ** 2, 0.0),
+        )
+
+    rw[cmad == 0] = 1.0
+
+    return rw
+
+
+# ==============================================================================
+#                     FUNCTION TO DECOMPOSE MANY SERIES AT ONCE
+# ==============================================================================
+
+
+def batch_stl(
+    values,
+    period,
+    seasonal=7,
+    trend=None,
+    low_pass=None,
+    seasonal_deg=1,
+    trend_deg=1,
+    low_pass_deg=1,
+    robust=False,
+    inner_iter=None,
+    outer_iter=None,
+    tol=None,
+):
+    """
+    Decompose every row of a units x periods matrix with STL, running the
+    LOESS inner and outer loops vectorized across rows.
+
+    Parameters
+    ----------
+    values: array_like
+        A 2-D array with one series of equal length per row. A 1-D array is
+        treated as a single row.
+
+    period: int
+        Periodicity of the sequence of the phenomenon to be decomposed.
+
+    seasonal, trend, low_pass: int
+        Lengths of the seasonal, trend and low-pass smoothers, with the
+        defaults of `statsmodels.tsa.seasonal.STL`.
+
+    seasonal_deg, trend_deg, low_pass_deg: int
+        Degrees (0 or 1) of the respective LOESS.
+
+    robust: bool
+        Whether to use robustness weights.
+
+    inner_iter, outer_iter: int
+        Iterations of the inner and outer loops. Default to 2 and 15 when
+        robust, 5 and 0 otherwise.
+
+    tol: float
+        Stop the outer loop of a row early once its robustness weights change
+        by at most `tol` on average between two iterations. Converged rows are
+        left out of the remaining iterations. None (default) always runs
+        `outer_iter` iterations.
+
+    Returns
+    A dictionary of "observed", "trend", "seasonal", "resid" and "weights"
+    arrays, each with the shape of `values`, and "iterations", the number of
+    outer iterations run for each row. Without `tol`, results match per-series
+    statsmodels fits up to floating-point summation order.
+
+    Notes
+    Smoothers are evaluated at every point, i.e. the statsmodels `*_jump`
+    settings are fixed at 1 (their defaults).
+    """
+
+    y = np.atleast_2d(np.asarray(values, dtype="float64"))
+    if y.ndim != 2:
+        raise ValueError("values must be a 1-D or 2-D array")
+    if not np.isfinite(y).all():
+        raise ValueError("values must not contain missing or infinite values")
+
+    seasonal, trend, low_pass = stl_settings(period, seasonal, trend, low_pass)
+
+    if inner_iter is None:
+        inner_iter = 2 if robust else 5
+    if outer_iter is None:
+        outer_iter = 15 if robust else 0
+
+    rows, n = y.shape
+    season = np.zeros((rows, n))
+    trend_ = np.zeros((rows, n))
+    rw = np.ones((rows, n))
+    iterations = np.zeros(rows, dtype="int64")
+    use_rw = False
+
+    ## Rows still iterating; converged rows keep their last fit ----
+    active = np.arange(rows)
+
+    ## Outer loop: inner passes followed by robustness reweighting ----
+    k = 0
+    while True:
+        y_k = y[active]
+        trend_k = trend_[active]
+        weights = rw[active] if use_rw else None
+
+        ### Inner loop ----
+        for _ in range(inner_iter):
+            cycle = _cycle_subseries(y_k - trend_k, period, seasonal, seasonal_deg, weights)
+            low = _moving_average(
+                _moving_average(_moving_average(cycle, period), period), 3
+            )
+            low = _smooth(low, low_pass, low_pass_deg)
+            season_k = cycle[:, period : period + n] - low
+            trend_k = _smooth(y_k - season_k, trend, trend_deg, weights)
+
+        season[active] = season_k
+        trend_[active] = trend_k
+
+        k += 1
+        if k > outer_iter:
+            break
+
+        updated = _robustness_weights(y_k, trend_k + season_k)
+        iterations[active] = k
+
+        ### Drop rows whose weights no longer move ----
+        if tol is not None and use_rw:
+            converged = np.abs(updated - weights).mean(axis=1) <= tol
+        else:
+            converged = np.zeros(active.size, dtype=bool)
+
+        rw[active] = updated
+        use_rw = True
+        active = active[~converged]
+        if active.size == 0:
+            break
+
+    return {
+        "observed": y,
+        "trend": trend_,
+        "seasonal": season,
+        "resid": y - season - trend_,
+        "weights": rw,
+        "iterations": iterations,
+    }
+
+
+
+# ==============================================================================
+#            FUNCTION TO DECOMPOSE MANY SERIES WITH SEVERAL SEASONALITIES
+# ==============================================================================
+
+
+def batch_mstl(values, periods, seasonal=None, iterate=2, **stl_kwargs):
+    """
+    Decompose every row of a units x periods matrix into a trend and one
+    seasonal component per period, following `statsmodels.tsa.seasonal.MSTL`
+    with `batch_stl()` as the inner STL.
+
+    Parameters
+    ----------
+    values: array_like
+        A 2-D array with one series of equal length per row.
+
+    periods: int or sequence of int
+        The seasonal periods, e.g. (7, 365) for daily data.
+
+    seasonal: int or sequence of int
+        Lengths of the seasonal smoothers, see `mstl_settings()`.
+
+    iterate: int
+        Number of passes over the seasonal components when there are several.
+
+    **stl_kwargs: Further arguments of `batch_stl()`, e.g. `robust=True`.
+
+    Returns
+    A dictionary like `batch_stl()`'s, where "seasonal" is a 3-D array of
+    shape (rows, n, periods) and "iterations" the most outer iterations any
+    of the STL fits ran, plus the "periods" actually decomposed.
+    """
+
+    y = np.atleast_2d(np.asarray(values, dtype="float64"))
+    periods, seasonal = mstl_settings(periods, seasonal, y.shape[1])
+
+    if len(periods) == 1:
+        iterate = 1
+
+    ## Extract each seasonality from the series deseasonalised of the others ----
+    seasonals = np.zeros((len(periods),) + y.shape)
+    iterations = np.zeros(y.shape[0], dtype="int64")
+    deseasonalised = y
+
+    for _ in range(iterate):
+        for i, (period, length) in enumerate(zip(periods, seasonal)):
+            deseasonalised = deseasonalised + seasonals[i]
+            fit = batch_stl(deseasonalised, period, length, **stl_kwargs)
+            seasonals[i] = fit["seasonal"]
+            deseasonalised = deseasonalised - seasonals[i]
+            iterations = np.maximum(iterations, fit["iterations"])
+
+    return {
+        "observed": y,
+        "trend": fit["trend"],
+        "seasonal": np.moveaxis(seasonals, 0, -1),
+        "resid": deseasonalised - fit["trend"],
+        "weights": fit["weights"],
+        "iterations": iterations,
+        "periods": periods,
+    }
@@ -0,0 +1,205 @@
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from importlib.metadata import version
+from io import StringIO
+
+from modules.decompose_disease import (
+    apply_stl_decomposition,
+    pull_all_components,
+    pull_component_and_concatenate,
+    summarise_disease,
+)
+from modules.synthetic import DATE_FORMATS, PERIODS, generate_admissions_panel
+
+# ==============================================================================
+#                     FUNCTION TO TIME A SINGLE STAGE
+# ==============================================================================
+
+
+def _measure(func, repeat=1):
+    """
+    Run `func` `repeat` times and record its best wall time and the peak
+    memory allocated by Python during a traced run. An untraced warm-up run
+    comes first, so that lazy imports and caches filled on first use do not
+    count towards the peak of the stage.
+
+    Returns a `(result, record)` tuple.
+    """
+
+    ### Warm-up run, untraced and untimed ----
+    with redirect_stdout(StringIO()):
+        func()
+
+    ### Run under tracemalloc for peak memory ----
+    tracemalloc.start()
+    with redirect_stdout(StringIO()):
+        result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ### Further runs without tracing for wall time ----
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            func()
+        times.append(time.perf_counter() - start)
+
+    return result, {"seconds": min(times), "peak_bytes": peak, "repeat": repeat}
+
+
+def _environment():
+    """Commit, library versions and host of a benchmark run."""
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "versions": {
+            library: version(library)
+            for library in ("numpy", "pandas", "scipy", "statsmodels")
+        },
+    }
+
+
+# ==============================================================================
+#              FUNCTION TO BENCHMARK THE DECOMPOSITION PIPELINE
+# ==============================================================================
+
+
+def run_benchmarks(
+    n_units=34,
+    diseases=("ARI", "AWD", "Measles", "Pneumonia"),
+    years=4,
+    frequency="M",
+    seasonal=7,
+    backends=("statsmodels", "batch"),
+    repeat=1,
+    seed=0,
+    output=None,
+):
+    """
+    Time the decomposition pipeline on a synthetic admissions panel.
+
+    Parameters
+
+    ----------
+    n_units, diseases, years, frequency, seed:
+    Shape of the panel, see `generate_admissions_panel()`.
+
+    seasonal: int
+    Length of the seasonal smoother.
+
+    backends: tuple of str
+    Backends of `apply_stl_decomposition()` to time.
+
+    repeat: int
+    Number of timed runs per stage; the best wall time is kept.
+
+    output: str
+    A JSON-lines file the records are appended to, so that runs on
+    successive commits can be compared.
+
+    Returns
+    A list of records, one per stage, each holding the stage name, panel
+    shape, wall time (s), peak memory (bytes) and run environment.
+    """
+
+    data = generate_admissions_panel(
+        n_units, diseases, years, frequency, seed=seed
+    )
+    date_format = DATE_FORMATS[frequency]
+    period = PERIODS[frequency]
+    first = data[data["disease"] == diseases[0]]
+
+    settings = {
+        "decompose": "admission",
+        "index": "time",
+        "seasonal": seasonal,
+        "period": period,
+        "date_format": date_format,
+        "frequency": frequency,
+    }
+
+    ## Stages of the pipeline ----
+    stages = {
+        "summarise_disease": lambda: summarise_disease(
+            first, "time", date_format, frequency
+        ),
+    }
+    for backend in backends:
+        stages[f"apply_stl_decomposition[single,{backend}]"] = (
+            lambda backend=backend: apply_stl_decomposition(
+                first, scope="single", backend=backend, **settings
+            )
+        )
+        stages[f"apply_stl_decomposition[multiple,{backend}]"] = (
+            lambda backend=backend: {
+                disease: apply_stl_decomposition(
+                    data[data["disease"] == disease],
+                    scope="multiple",
+                    analysis_unit="province",
+                    backend=backend,
+                    **settings,
+                )
+                for disease in diseases
+            }
+        )
+
+    ## Time every stage ----
+    environment = _environment()
+    panel = {
+        "n_units": n_units,
+        "n_diseases": len(diseases),
+        "years": years,
+        "frequency": frequency,
+        "rows": len(data),
+    }
+    records = []
+    decomposed = None
+
+    for stage, func in stages.items():
+        result, record = _measure(func, repeat)
+        if stage.startswith("apply_stl_decomposition[multiple"):
+            decomposed = result
+        records.append({"stage": stage, **panel, **record, **environment})
+
+    result, record = _measure(
+        lambda: [
+            pull_component_and_concatenate(results, "trend")
+            for results in decomposed.values()
+        ],
+        repeat,
+    )
+    records.append(
+        {"stage": "pull_component_and_concatenate", **panel, **record, **environment}
+    )
+
+    result, record = _measure(
+        lambda: [pull_all_components(results) for results in decomposed.values()],
+        repeat,
+    )
+    records.append(
+        {"stage": "pull_all_components", **panel, **record, **environment}
+    )
+
+    ## Append machine-readable records ----
+    if output is not None:
+        with open(output, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    return records
@@ -0,0 +1,223 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from modules.decompose_disease import _fit_batch, _resolve_period, map_units
+from modules.instrument import stage
+from modules.panel import DecompositionPanel
+
+# ==============================================================================
+#              FUNCTIONS TO BOOTSTRAP THE DECOMPOSITION OF ONE UNIT
+# ==============================================================================
+
+## Components given uncertainty bands ----
+BAND_COMPONENTS = ("trend", "seasonal")
+
+
+def moving_block_indices(n, block, replicates, rng):
+    """
+    Positions of `replicates` moving-block resamples of a series of length
+    `n`: blocks of `block` consecutive positions with uniformly drawn starts,
+    concatenated and cut to `n`.
+    """
+
+    n_blocks = -(-n // block)
+    starts = rng.integers(0, n - block + 1, size=(replicates, n_blocks))
+
+    return (starts[:, :, None] + np.arange(block)).reshape(replicates, -1)[:, :n]
+
+
+def _bootstrap_unit(
+    item,
+    replicates,
+    block,
+    seasonal,
+    period,
+    quantiles,
+    batch_size,
+    fit_kwargs,
+):
+    """
+    Percentile bands of the trend and seasonal components of one unit;
+    runs in a worker.
+
+    `item` is a `(trend, seasonal, resid, lmbda, seed)` tuple of components on
+    the scale the unit was decomposed on. Returns an array of shape
+    (components, quantiles, times) on the original scale.
+    """
+
+    trend, season, resid, lmbda, seed = item
+    rng = np.random.default_rng(seed)
+
+    ## Replicates: the fit plus resampled blocks of the remainder ----
+    positions = moving_block_indices(len(resid), block, replicates, rng)
+    series = (trend + season)[None, :] + resid[positions]
+
+    ## Refit the replicates in vectorized batches ----
+    draws = np.empty((len(BAND_COMPONENTS), replicates, len(resid)))
+    for start in range(0, replicates, batch_size):
+        fitted = _fit_batch(series[start : start + batch_size], seasonal, period, **fit_kwargs)
+        stop = start + len(fitted["trend"])
+
+        draws[0, start:stop] = fitted["trend"]
+        seasonal_fit = fitted["seasonal"]
+        draws[1, start:stop] = seasonal_fit.sum(axis=2) if seasonal_fit.ndim == 3 else seasonal_fit
+
+    bands = np.percentile(draws, quantiles, axis=1).swapaxes(0, 1)
+
+    if np.isnan(lmbda):
+        return bands
+
+    ### Percentiles commute with the monotone back-transform ----
+    from scipy.special import inv_boxcox
+
+    return inv_boxcox(bands, lmbda)
+
+
+# ==============================================================================
+#           FUNCTION TO BOOTSTRAP UNCERTAINTY BANDS OF EVERY ANALYSIS UNIT
+# ==============================================================================
+
+
+def bootstrap_components(
+    results,
+    seasonal,
+    period=None,
+    replicates=500,
+    block=None,
+    level=95,
+    seed=None,
+    frequency="M",
+    n_jobs=1,
+    batch_size=100,
+    unit_name="unit",
+    robust=False,
+    inner_iter=None,
+    outer_iter=None,
+):
+    """
+    Moving-block bootstrap percentile bands of the trend and seasonal
+    components of every analysis unit.
+
+    Each replicate adds resampled blocks of the unit's remainder to its
+    fitted trend and seasonality and is decomposed again with the vectorized
+    engine of `modules.batch_stl`, so that all replicates of a unit are fitted
+    in a few batched calls. Units decomposed on the Box-Cox scale are
+    resampled on that scale and their bands back-transformed.
+
+    Parameters
+    ----------
+    results: DecompositionPanel or dict
+        Decompositions returned by `apply_stl_decomposition(scope="multiple")`;
+        see `DecompositionPanel.require_lambdas()` for back-transformed units.
+
+    seasonal, period:
+        The smoother length and period(s) the results were decomposed with,
+        see `apply_stl_decomposition()`.
+
+    replicates: int
+        Number of bootstrap replicates per unit.
+
+    block: int
+        Length of the resampled remainder blocks. Defaults to the (longest)
+        period, keeping a season of autocorrelation in every block.
+
+    level: float
+        Coverage of the percentile bands, in percent.
+
+    seed: int
+        Seed of the random number generator. Every unit draws from its own
+        stream spawned from it, so bands do not depend on `n_jobs`.
+
+    frequency: str
+        Period frequency of the series, used when `period` is None.
+
+    n_jobs: int
+        Number of worker processes bootstrapping the units.
+
+    batch_size: int
+        Number of replicates decomposed per vectorized call, bounding memory.
+
+    unit_name: str or list of str
+        Name of the unit column, or one name per level of tuple units.
+
+    robust, inner_iter, outer_iter:
+        Robust STL settings of the refits, see `decompose_series()`.
+
+    Returns
+    A tidy DataFrame with one row per unit, period and component ("trend"
+    and "seasonal"), holding the estimate and the lower and upper bounds of
+    the band.
+    """
+
+    period = _resolve_period(period, frequency)
+    block = int(np.max(period)) if block is None else int(block)
+
+    panel = (
+        results
+        if isinstance(results, DecompositionPanel)
+        else DecompositionPanel.from_results(results)
+    )
+
+    panel.require_lambdas()
+
+    with stage("bootstrap"):
+
+        ## Components of every unit over its own span, on its model scale ----
+        trend, season, resid = (panel.model_scale(c) for c in ("trend", "seasonal", "resid"))
+        covered = ~np.isnan(panel.model_scale("observed"))
+
+        ### Replicates are refitted over a contiguous span of periods ----
+        first = covered.argmax(axis=1)
+        last = covered.shape[1] - 1 - covered[:, ::-1].argmax(axis=1)
+        if (covered.sum(axis=1) != last - first + 1).any():
+            raise ValueError("Series must cover every period between their first and last.")
+
+        lambdas = np.where(panel.transformed, panel.lmbda, np.nan)
+        seeds = np.random.SeedSequence(seed).spawn(len(panel.units))
+
+        if covered.sum(axis=1).min() < block:
+            raise ValueError("Every series must be at least one block long.")
+
+        items = [
+            (trend[u, c], season[u, c], resid[u, c], lambdas[u], seeds[u])
+            for u, c in enumerate(covered)
+        ]
+
+        bootstrap_unit = partial(
+            _bootstrap_unit,
+            replicates=replicates,
+            block=block,
+            seasonal=seasonal,
+            period=period,
+            quantiles=[50 - level / 2, 50 + level / 2],
+            batch_size=batch_size,
+            fit_kwargs={"robust": robust, "inner_iter": inner_iter, "outer_iter": outer_iter},
+        )
+        bands = map_units(bootstrap_unit, items, n_jobs)
+
+        ## One tidy frame of estimates and bands ----
+        frames = []
+        for u, (c, band) in enumerate(zip(covered, bands)):
+            for k, component in enumerate(BAND_COMPONENTS):
+                frames.append(
+                    pd.DataFrame(
+                        {
+                            "unit": u,
+                            "time": panel.times[c],
+                            "component": component,
+                            "estimate": panel.values[u, c, panel.components.index(component)],
+                            "lower": band[k, 0],
+                            "upper": band[k, 1],
+                        }
+                    )
+                )
+
+        tidy = pd.concat(frames, ignore_index=True)
+        tidy = tidy.rename(columns={"time": panel.times.name or "time"})
+
+        units = tidy.pop("unit").to_numpy()
+        tidy = panel.unit_columns(unit_name, units).join(tidy)
+
+    return tidy
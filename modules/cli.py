@@ -0,0 +1,189 @@
+# ==============================================================================
+#                 COMMAND-LINE ENTRY POINT FOR SHORT BATCH JOBS
+# ==============================================================================
+#
+# Usage:
+#   python -m modules.cli --help
+#   python -m modules.cli validate data.csv
+#   python -m modules.cli summarise data.csv --unit province -o ts.csv
+#   python -m modules.cli bench --units 400 --frequency W -o bench.jsonl
+#
+# Only the standard library is imported at start-up; pandas is loaded by the
+# subcommands that need it, and scipy/statsmodels are never loaded here.
+
+import argparse
+import sys
+from pathlib import Path
+
+
+## ---- Helpers ----------------------------------------------------------------
+
+
+def _sheet(value):
+    """Excel sheets are given by position when numeric, by name otherwise."""
+
+    return int(value) if value.isdigit() else value
+
+
+def _read(path, sheet):
+    """Read a CSV, Parquet or Excel file into a DataFrame."""
+
+    import pandas as pd
+
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        return pd.read_csv(path)
+    elif suffix == ".parquet":
+        return pd.read_parquet(path)
+    elif suffix in (".xls", ".xlsx"):
+        from modules.ingest import read_excel_cached
+
+        return read_excel_cached(path, sheet_name=sheet)
+    else:
+        raise SystemExit(f"Unsupported file type: {path}")
+
+
+def _write(data, output):
+    """Write a DataFrame to CSV/Parquet, or print it when no output is given."""
+
+    if output is None:
+        print(data.to_string())
+    elif Path(output).suffix.lower() == ".parquet":
+        data.to_parquet(output)
+    else:
+        data.to_csv(output)
+
+
+## ---- Subcommands ------------------------------------------------------------
+
+
+def _validate(args):
+    from modules.decompose_disease import check_missing_values
+
+    summary = check_missing_values(_read(args.path, args.sheet))
+    if summary is not None:
+        _write(summary.to_frame("missing"), args.output)
+        return 1
+
+    return 0
+
+
+def _summarise(args):
+    from modules.decompose_disease import summarise_by_unit, summarise_disease
+
+    data = _read(args.path, args.sheet)
+    if args.unit:
+        ts = summarise_by_unit(
+            data, args.index, args.unit, args.date_format, args.period
+        )
+    else:
+        ts = summarise_disease(data, args.index, args.date_format, args.period)
+
+    _write(ts, args.output)
+
+    return 0
+
+
+def _bench(args):
+    from modules.benchmark import run_benchmarks
+
+    records = run_benchmarks(
+        n_units=args.units,
+        diseases=tuple(args.diseases),
+        years=args.years,
+        frequency=args.frequency,
+        backends=tuple(args.backends),
+        repeat=args.repeat,
+        output=args.output,
+    )
+    for record in records:
+        print(
+            f"{record['stage']:<50} {record['seconds']:>9.4f} s"
+            f" {record['peak_bytes'] / 2**20:>9.1f} MiB"
+        )
+
+    return 0
+
+
+## ---- Parser -----------------------------------------------------------------
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m modules.cli",
+        description="Validate, summarise and benchmark admissions data.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ### Arguments shared by all subcommands ----
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("path", help="CSV, Parquet or Excel file of admissions.")
+    common.add_argument(
+        "--sheet",
+        default=0,
+        type=_sheet,
+        help="Excel sheet name or position. Defaults to 0.",
+    )
+    common.add_argument(
+        "-o", "--output", help="CSV or Parquet file to write. Defaults to stdout."
+    )
+
+    validate = subparsers.add_parser(
+        "validate", parents=[common], help="Check the data for missing values."
+    )
+    validate.set_defaults(func=_validate)
+
+    summarise = subparsers.add_parser(
+        "summarise", parents=[common], help="Summarise admissions into time series."
+    )
+    summarise.add_argument(
+        "--index", default="time", help="Variable holding the time labels."
+    )
+    summarise.add_argument(
+        "--unit", nargs="*", help="Analysis unit variable(s), e.g. province."
+    )
+    summarise.add_argument(
+        "--date-format", default="%B %Y", help="Format of the time labels."
+    )
+    summarise.add_argument(
+        "--period", default="M", help="Time period of the series. Defaults to M."
+    )
+    summarise.set_defaults(func=_summarise)
+
+    bench = subparsers.add_parser(
+        "bench", help="Benchmark the pipeline on a synthetic panel."
+    )
+    bench.add_argument("--units", type=int, default=34, help="Analysis units.")
+    bench.add_argument(
+        "--diseases",
+        nargs="+",
+        default=["ARI", "AWD", "Measles", "Pneumonia"],
+        help="Diseases per unit.",
+    )
+    bench.add_argument("--years", type=int, default=4, help="Years per series.")
+    bench.add_argument(
+        "--frequency", choices=["M", "W", "D"], default="M", help="Time frequency."
+    )
+    bench.add_argument(
+        "--backends",
+        nargs="+",
+        default=["statsmodels", "batch"],
+        help="Decomposition backends to time.",
+    )
+    bench.add_argument("--repeat", type=int, default=1, help="Timed runs per stage.")
+    bench.add_argument(
+        "-o", "--output", help="JSON-lines file to append the results to."
+    )
+    bench.set_defaults(func=_bench)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+import numpy as np
+import pandas as pd
+
+from modules.decompose_disease import NAT_CODE, decode_periods, encode_periods
+from modules.instrument import stage
+
+# ==============================================================================
+#         PRECOMPUTED ADMISSION SUMS OVER (TIME, PROVINCE, DISEASE)
+# ==============================================================================
+
+
+class AdmissionCube:
+    """
+    Admission sums over a dense (time, province, disease) grid, built with a
+    single pass over the source rows. Rollups and selections are answered
+    from the grid without rescanning the source.
+
+    Parameters
+    ----------
+    values: ndarray
+        A 3-D array of shape (times, provinces, diseases) of summed
+        admissions. Missing admissions count as zero, as in
+        `summarise_by_unit()`.
+
+    rows: ndarray
+        Number of source rows behind every cell, 0 where a province reported
+        nothing for a disease and period.
+
+    times: PeriodIndex
+        Every period from the first to the last one observed, gaps included.
+
+    provinces, diseases: Index
+        Labels of the second and third axes. The disease axis may also hold
+        measures such as SAM and MAM admissions.
+
+    names: tuple of str
+        Names of the time, province and disease variables, used to label
+        panels.
+    """
+
+    __slots__ = ("values", "rows", "times", "provinces", "diseases", "names")
+
+    def __init__(
+        self,
+        values,
+        rows,
+        times,
+        provinces,
+        diseases,
+        names=("time", "province", "disease"),
+    ):
+        self.values = np.asarray(values, dtype="float64")
+        self.rows = np.asarray(rows, dtype="int64")
+        self.times = pd.PeriodIndex(times)
+        self.provinces = pd.Index(provinces)
+        self.diseases = pd.Index(diseases)
+        self.names = tuple(names)
+
+        shape = (len(self.times), len(self.provinces), len(self.diseases))
+        if self.values.shape != shape or self.rows.shape != shape:
+            raise ValueError("values and rows must have shape (times, provinces, diseases).")
+
+    ## ---- Construction -------------------------------------------------------
+
+    @classmethod
+    def from_frame(
+        cls,
+        data,
+        value="admission",
+        time="time",
+        province="province",
+        disease="disease",
+        date_format="%B %Y",
+        frequency="M",
+    ):
+        """
+        Build a cube from long admissions data in one pass.
+
+        Parameters
+        ----------
+        data: DataFrame of admissions, one row per province, disease and
+        period, e.g. the melted morbidity table.
+
+        value: str or list of str
+            The admissions variable. A list of variables, e.g. ["sam", "mam"],
+            makes them the disease axis of the cube, with `disease` None.
+
+        time: str
+            The time variable: labels in `date_format`, dates or periods.
+
+        province, disease: str
+            The variables of the province and disease axes.
+
+        frequency: str
+            Period frequency of the time axis, e.g. "M".
+
+        Returns
+        An `AdmissionCube`.
+        """
+
+        with stage("cube"):
+            codes = encode_periods(data[time], date_format, frequency)
+            valid = codes != NAT_CODE
+
+            ### Contiguous time axis from the first to the last period ----
+            first, last = codes[valid].min(), codes[valid].max()
+            t = codes[valid] - first
+            p, provinces = pd.factorize(data[province].to_numpy()[valid], sort=True)
+
+            if isinstance(value, str):
+                d, diseases = pd.factorize(data[disease].to_numpy()[valid], sort=True)
+                measures = data[value].to_numpy(dtype="float64", na_value=np.nan)
+                measures = measures[valid][:, None]
+                d = d[:, None]
+            else:
+                diseases = pd.Index(value)
+                measures = data[list(value)].to_numpy(dtype="float64", na_value=np.nan)
+                measures = measures[valid]
+                d = np.broadcast_to(np.arange(len(value)), measures.shape)
+
+            shape = (last - first + 1, len(provinces), len(diseases))
+            flat = np.ravel_multi_index(
+                (np.broadcast_to(t[:, None], d.shape), np.broadcast_to(p[:, None], d.shape), d),
+                shape,
+            ).ravel()
+
+            ### Sums and row counts of every cell ----
+            size = int(np.prod(shape))
+            values = np.bincount(
+                flat, weights=np.nan_to_num(measures.ravel()), minlength=size
+            ).reshape(shape)
+            rows = np.bincount(flat, minlength=size).reshape(shape)
+
+        return cls(
+            values,
+            rows,
+            decode_periods(np.arange(first, last + 1), frequency),
+            provinces,
+            diseases,
+            names=(time, province, "disease" if disease is None else disease),
+        )
+
+    ## ---- Access -------------------------------------------------------------
+
+    def __repr__(self):
+        return (
+            f"AdmissionCube({len(self.times)} periods x {len(self.provinces)} "
+            f"provinces x {len(self.diseases)} diseases)"
+        )
+
+    @property
+    def nbytes(self):
+        """Memory held by the sums and row counts."""
+
+        return self.values.nbytes + self.rows.nbytes
+
+    def sel(self, provinces=None, diseases=None, start=None, end=None):
+        """
+        Select provinces, diseases and/or a time range. Time slices are views
+        of the cube; selecting labels copies only the selected cells.
+        """
+
+        def indexer(index, labels):
+            if labels is None:
+                return slice(None)
+            if isinstance(labels, str):
+                labels = [labels]
+            positions = index.get_indexer(labels)
+            if (positions < 0).any():
+                raise KeyError(f"Unknown labels in selection: {list(labels)}")
+            return positions
+
+        t = self.times.slice_indexer(start, end)
+        p = indexer(self.provinces, provinces)
+        d = indexer(self.diseases, diseases)
+
+        return AdmissionCube(
+            self.values[t][:, p][:, :, d],
+            self.rows[t][:, p][:, :, d],
+            self.times[t],
+            self.provinces[p],
+            self.diseases[d],
+            self.names,
+        )
+
+    ## ---- Rollups ------------------------------------------------------------
+
+    def rollup(self, province=None, disease=None):
+        """
+        Sum provinces and/or diseases into groups.
+
+        Parameters
+        ----------
+        province, disease: None, str or dict
+            None keeps every label as is. A string sums all labels into one
+            group of that name, e.g. province="National". A dictionary of
+            group name to labels sums custom groups, e.g. regions or
+            disease={"GAM": ["SAM", "MAM"]}; a label may belong to several
+            groups and unlisted labels are left out.
+
+        Returns
+        A new `AdmissionCube` whose axes hold the groups.
+        """
+
+        with stage("rollup"):
+            p_groups, p_members = _membership(self.provinces, province)
+            d_groups, d_members = _membership(self.diseases, disease)
+
+            values = np.einsum(
+                "tpd,pg,dh->tgh", self.values, p_members, d_members, optimize=True
+            )
+            rows = np.einsum(
+                "tpd,pg,dh->tgh", self.rows, p_members, d_members, optimize=True
+            )
+
+        return AdmissionCube(values, rows, self.times, p_groups, d_groups, self.names)
+
+    ## ---- Conversion ---------------------------------------------------------
+
+    def to_panel(self, by=("province", "disease")):
+        """
+        Admission series in the layout of `summarise_by_unit()`, ready for
+        `apply_stl_decomposition(summarised=True)`.
+
+        Parameters
+        ----------
+        by: str or tuple of str
+            The axes defining the analysis units: "province", "disease", both
+            or neither. Axes left out must hold a single label, e.g. after a
+            rollup or selection.
+
+        Returns
+        A DataFrame with a MultiIndex of analysis unit(s) and time holding an
+        "admission" column, with cells no source row contributed to left
+        out. With `by=()`, a DataFrame indexed by time, as returned by
+        `summarise_disease()`.
+        """
+
+        by = (by,) if isinstance(by, str) else tuple(by)
+        axes = {"province": self.provinces, "disease": self.diseases}
+
+        unknown = set(by) - set(axes)
+        if unknown:
+            raise ValueError(f"by must name 'province' and/or 'disease', not {unknown}")
+        for axis, labels in axes.items():
+            if axis not in by and len(labels) != 1:
+                raise ValueError(
+                    f"{axis} holds {len(labels)} labels; add it to `by` or sum it "
+                    "with rollup() first"
+                )
+
+        ### Unit axes first, then time, then the single-label axes ----
+        keep = [1 + list(axes).index(axis) for axis in by]
+        drop = [i for i in (1, 2) if i not in keep]
+        order = keep + [0] + drop
+
+        values = self.values.transpose(order).reshape(-1)
+        present = self.rows.transpose(order).reshape(-1) > 0
+
+        times = self.times.to_timestamp()
+        if keep:
+            index = pd.MultiIndex.from_product(
+                [axes[axis] for axis in by] + [times],
+                names=[self.names[i] for i in keep] + [self.names[0]],
+            )
+        else:
+            index = times.rename(self.names[0])
+
+        return pd.DataFrame({"admission": values}, index=index)[present]
+
+
+# ==============================================================================
+#                FUNCTION TO MAP LABELS ONTO ROLLUP GROUPS
+# ==============================================================================
+
+
+def _membership(labels, groups):
+    """
+    Group names and a (labels x groups) 0/1 membership matrix for a rollup
+    specification, see `AdmissionCube.rollup()`.
+    """
+
+    if groups is None:
+        return labels, np.eye(len(labels))
+    if isinstance(groups, str):
+        return pd.Index([groups]), np.ones((len(labels), 1))
+
+    members = np.zeros((len(labels), len(groups)))
+    for g, group_labels in enumerate(groups.values()):
+        if isinstance(group_labels, str):
+            group_labels = [group_labels]
+        positions = labels.get_indexer(group_labels)
+        if (positions < 0).any():
+            raise KeyError(f"Unknown labels in rollup group: {list(group_labels)}")
+        members[positions, g] = 1
+
+    return pd.Index(list(groups)), members
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import pickle
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+import numpy as np
+
+# ==============================================================================
+#                   LIBRARIES WHOSE VERSIONS ARE PART OF THE KEY
+# ==============================================================================
+
+KEYED_LIBRARIES = ("numpy", "pandas", "scipy", "statsmodels")
+
+
+def _library_versions():
+    """Installed versions of the libraries the decomposition depends on."""
+
+    versions = {}
+    for library in KEYED_LIBRARIES:
+        try:
+            versions[library] = version(library)
+        except PackageNotFoundError:
+            versions[library] = None
+
+    return versions
+
+
+# ==============================================================================
+#                  FUNCTION TO FINGERPRINT A TIME SERIES
+# ==============================================================================
+
+
+def series_fingerprint(series):
+    """
+    Hash the values and the time index of a series.
+
+    Parameters
+
+    ----------
+    series : A pandas Series, e.g. a column of the DataFrame returned by
+    `summarise_disease()`.
+
+    Returns
+    A hexadecimal digest that changes whenever any value or period changes.
+    """
+
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(series.to_numpy(dtype="float64")).tobytes())
+    digest.update(np.ascontiguousarray(series.index.to_numpy()).tobytes())
+
+    return digest.hexdigest()
+
+
+# ==============================================================================
+#                  ON-DISK CACHE OF DECOMPOSITION RESULTS
+# ==============================================================================
+
+
+class DecompositionCache:
+    """
+    Size-capped, least-recently-used on-disk cache of decomposition results.
+
+    Parameters
+
+    ----------
+    directory: str
+    Where cached results are pickled. Defaults to ".cache/decompositions".
+
+    max_bytes: int
+    Total size the cache may occupy before the least recently used results
+    are evicted. Defaults to 512 MiB.
+
+    Notes
+    `hits` and `misses` count lookups made through this instance, so that a
+    rerun can confirm it did not decompose anything.
+    """
+
+    def __init__(self, directory=Path(".cache") / "decompositions", max_bytes=512 * 2**20):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, series, **params):
+        """
+        Build the cache key of a series decomposed with `params`. The key also
+        covers the versions of numpy, pandas, scipy and statsmodels.
+        """
+
+        params = json.dumps(
+            {"params": params, "versions": _library_versions()},
+            sort_keys=True,
+            default=str,
+        )
+
+        return hashlib.sha256(
+            (series_fingerprint(series) + params).encode()
+        ).hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.pkl"
+
+    def get(self, key):
+        """Return the cached result of `key`, or None on a miss."""
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+        ### Mark as recently used for eviction ----
+        os.utime(path)
+        self.hits += 1
+
+        return result
+
+    def put(self, key, result):
+        """Store `result` under `key` and evict old results above the cap."""
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+
+        ### Write atomically so concurrent readers never see partial files ----
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+        self._evict()
+
+    def _evict(self):
+        """Delete least recently used results until under `max_bytes`."""
+
+        entries = [(p, p.stat()) for p in self.directory.glob("*.pkl")]
+        total = sum(stat.st_size for _, stat in entries)
+
+        for path, stat in sorted(entries, key=lambda entry: entry[1].st_mtime):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+
+    def info(self):
+        """Counters and current footprint of the cache."""
+
+        sizes = [p.stat().st_size for p in self.directory.glob("*.pkl")]
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(sizes),
+            "bytes": sum(sizes),
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        """Remove every cached result and reset the counters."""
+
+        for path in self.directory.glob("*.pkl"):
+            path.unlink(missing_ok=True)
+        self.hits = 0
+        self.misses = 0
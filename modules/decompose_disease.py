@@ -1,10 +1,13 @@
 import pandas as pd
 import calendar
-from scipy.stats import boxcox
-from scipy.special import inv_boxcox
-from statsmodels.tsa.seasonal import STL
+import os
+import warnings
+from functools import lru_cache, partial
 import numpy as np
 
+from modules.batch_stl import batch_mstl, batch_stl, mstl_settings
+from modules.instrument import stage
+
 # ==============================================================================
 #                     FUNCTION TO CHECK FOR MISSING VALUES
 # ==============================================================================
@@ -19,7 +22,8 @@ def check_missing_values(data):
     data : A non-wrangled data object.
 
     Returns 
-    A summary table if missing values exist.
+    A summary table if missing values exist. See `validate_panel()` for the
+    per-unit checks run before decomposition.
     """
 
     ## Check if there are missing values ----
@@ -38,6 +42,284 @@ def check_missing_values(data):
         )
 
 
+# ==============================================================================
+#               FUNCTION TO IMPUTE MISSING VALUES OF A WHOLE PANEL
+# ==============================================================================
+
+
+def impute_panel(data, value, by, method="bfill", limit=None):
+    """
+    Impute missing values of every series of a long panel in one grouped pass.
+
+    Parameters
+
+    ----------
+    data : A long DataFrame with rows in time order within each series, e.g.
+    the melted admissions.
+
+    value: str
+    The variable holding the values to be imputed, e.g. "admission".
+
+    by: str or list of str
+    The variable(s) defining a series, e.g. ["province", "disease"].
+
+    method: str or list of str
+    "bfill" (NOCB, default), "ffill" (LOCF) or "interpolate" (linear,
+    between observed values). A list applies the methods in turn, e.g.
+    ["bfill", "ffill"] to also fill trailing gaps.
+
+    limit: int
+    Maximum number of consecutive missing values to fill. Defaults to None
+    (no limit).
+
+    Returns
+    A `(imputed, report)` tuple: a copy of `data` with `value` imputed, and a
+    DataFrame counting the missing and imputed values of every series.
+    """
+
+    if isinstance(by, str):
+        by = [by]
+    methods = [method] if isinstance(method, str) else list(method)
+
+    keys = [data[column] for column in by]
+    filled = data[value]
+
+    ## Fill within series, one vectorized grouped pass per method ----
+    for m in methods:
+        grouped = filled.groupby(keys, sort=False, observed=True)
+        if m == "bfill":
+            filled = grouped.bfill(limit=limit)
+        elif m == "ffill":
+            filled = grouped.ffill(limit=limit)
+        elif m == "interpolate":
+            filled = grouped.transform(
+                lambda x: x.interpolate(limit=limit, limit_area="inside")
+            )
+        else:
+            raise ValueError("method must be 'bfill', 'ffill' or 'interpolate'")
+
+    ## Count missing and imputed cells per series ----
+    missing = data[value].isnull()
+    report = pd.DataFrame(
+        {"missing": missing, "imputed": missing & filled.notnull()}
+    ).groupby(keys, sort=False, observed=True).sum()
+
+    return data.assign(**{value: filled}), report
+
+
+# ==============================================================================
+#            FUNCTIONS TO VALIDATE A PANEL BEFORE ITS DECOMPOSITION
+# ==============================================================================
+
+
+def validate_panel(panel, decompose="admission", period=12, frequency="M", min_cycles=2):
+    """
+    Pre-flight checks of every analysis unit of a panel in one vectorized
+    pass, deciding up front how each unit is to be decomposed.
+
+    Parameters
+    ----------
+    panel : A panel returned by `summarise_by_unit()`, or in its layout.
+
+    decompose: str
+    The variable holding the series to be decomposed.
+
+    period: int or sequence of int
+    Periodicity of the series; the shortest period sets the minimum length,
+    as MSTL leaves out periods longer than half the series.
+
+    frequency: str
+    Period frequency of the time level, e.g. "M".
+
+    min_cycles: int
+    Minimum number of full cycles of the shortest period. STL needs two.
+
+    Returns
+    A DataFrame indexed by analysis unit with the number of periods, missing
+    values, non-positive values (which Box-Cox cannot transform) and gaps in
+    the period index, whether the first value is invalid, whether the series
+    is too short or constant, and the "strategy": "ok" to decompose as is,
+    "impute" to fill gaps, missing and non-positive values first (by ffill,
+    and by bfill before the first valid value), or "skip" when the series
+    is too short or has no two distinct valid values.
+    """
+
+    if not panel.index.is_monotonic_increasing:
+        panel = panel.sort_index()
+
+    levels = list(range(panel.index.nlevels - 1))
+    keys = [panel.index.get_level_values(level) for level in levels]
+
+    values = panel[decompose].to_numpy(dtype="float64", na_value=np.nan)
+    codes = encode_periods(pd.Series(panel.index.get_level_values(-1)), time_period=frequency)
+    invalid = np.isnan(values) | (values <= 0)
+    valid = np.where(invalid, np.nan, values)
+
+    ## Counts and spans of every unit in one grouped pass ----
+    report = (
+        pd.DataFrame(
+            {
+                "periods": np.ones(len(values), dtype="int64"),
+                "missing": np.isnan(values),
+                "nonpositive": values <= 0,
+                "leading_invalid": invalid,
+                "first": codes,
+                "last": codes,
+                "low": valid,
+                "high": valid,
+            }
+        )
+        .groupby(keys, sort=False, observed=True)
+        .agg(
+            {
+                "periods": "sum",
+                "missing": "sum",
+                "nonpositive": "sum",
+                "leading_invalid": "first",
+                "first": "min",
+                "last": "max",
+                "low": "min",
+                "high": "max",
+            }
+        )
+    )
+
+    span = report.pop("last") - report.pop("first") + 1
+    report.insert(3, "gaps", span - report["periods"])
+    report["too_short"] = span < min_cycles * int(np.min(period))
+    report["constant"] = ~(report.pop("high") > report.pop("low"))
+
+    ### Strategy per unit ----
+    report["strategy"] = np.select(
+        [
+            report["too_short"] | report["constant"],
+            (report[["missing", "nonpositive", "gaps"]] > 0).any(axis=1),
+        ],
+        ["skip", "impute"],
+        "ok",
+    )
+
+    return report
+
+
+def _repair_series(ts, decompose, frequency="M"):
+    """
+    Reindex a unit's series to every period between its first and last one,
+    and fill missing and non-positive values by ffill, and by bfill before
+    the first valid value, as planned by `validate_panel()`.
+    """
+
+    codes = encode_periods(pd.Series(ts.index), time_period=frequency)
+    index = decode_periods(np.arange(codes.min(), codes.max() + 1), frequency).to_timestamp()
+    index.name = ts.index.name
+
+    ts = ts.reindex(index)
+    ts[decompose] = ts[decompose].where(ts[decompose] > 0).ffill().bfill()
+
+    return ts
+
+
+def _preflight_units(by_unit, decompose, period, frequency="M", panel=None):
+    """
+    Validate the series of every analysis unit with `validate_panel()`, warn
+    about the units to be skipped and repair those to be imputed.
+
+    `by_unit` maps each unit to its time series; `panel` is the same data in
+    the layout of `summarise_by_unit()`, stacked from `by_unit` when None.
+
+    Returns a `(series, report)` tuple: a dictionary of every unit not
+    skipped to its series, ready to be decomposed, and the pre-flight report.
+    """
+
+    if panel is None:
+        panel = pd.concat(by_unit)
+
+    report = validate_panel(panel, decompose, period, frequency)
+    strategy = dict(zip(report.index, report["strategy"]))
+
+    skipped = [unit for unit in by_unit if strategy[unit] == "skip"]
+    if skipped:
+        warnings.warn(
+            f"Skipping {len(skipped)} unit(s) failing the pre-flight checks: {skipped}",
+            stacklevel=3,
+        )
+
+    series = {
+        unit: _repair_series(ts, decompose, frequency) if strategy[unit] == "impute" else ts
+        for unit, ts in by_unit.items()
+        if strategy[unit] != "skip"
+    }
+
+    return series, report
+
+
+# ==============================================================================
+#                 FUNCTIONS TO ENCODE TIME LABELS AS PERIOD CODES
+# ==============================================================================
+
+## Ordinal standing for a missing period, as in pandas' own PeriodArray ----
+NAT_CODE = np.iinfo(np.int64).min
+
+
+@lru_cache(maxsize=4096)
+def _parse_period(label, date_format, time_period):
+    """Parse a single time label into the ordinal of its period."""
+
+    return pd.Period(pd.to_datetime(label, format=date_format), freq=time_period).ordinal
+
+
+def encode_periods(labels, date_format="%B %Y", time_period="M"):
+    """
+    Encode time labels such as "January 2021" as integer period codes.
+
+    Only the unique labels are parsed, and parsed labels are memoised across
+    calls, so repeated labels cost a vectorized lookup rather than a parse.
+
+    Parameters
+
+    ----------
+    labels : Series of time labels. Period and datetime columns are encoded
+    without parsing.
+
+    date_format: str
+    The date format expressed in your data.
+
+    time_period: str
+    Whether monthl-, week-, day, quarter-based admissions. Defaults to "M"
+    for month.
+
+    Returns
+    An int64 array of period ordinals, with `NAT_CODE` for missing labels.
+    """
+
+    labels = pd.Series(labels)
+
+    ## Columns already holding dates need no parsing ----
+    if isinstance(labels.dtype, pd.PeriodDtype):
+        return labels.dt.asfreq(time_period).array.asi8
+    if pd.api.types.is_datetime64_any_dtype(labels):
+        return labels.dt.to_period(time_period).array.asi8
+
+    ## Parse unique labels once and broadcast back to rows ----
+    codes, uniques = pd.factorize(labels)
+    lookup = np.array(
+        [_parse_period(label, date_format, time_period) for label in uniques]
+        + [NAT_CODE],
+        dtype="int64",
+    )
+
+    ### Missing labels have code -1 and pick the trailing NAT_CODE ----
+    return lookup[codes]
+
+
+def decode_periods(codes, time_period="M"):
+    """
+    Turn period codes returned by `encode_periods()` back into a PeriodIndex.
+    """
+
+    return pd.PeriodIndex.from_ordinals(codes, freq=time_period)
+
+
 # ==============================================================================
 #           FUNCTION SUMMARISE ADMISSIONS AND MAKE A TIME-SERIES OBJECT
 # ==============================================================================
@@ -63,29 +345,119 @@ def summarise_disease(data, ts_index, date_format="%B %Y", time_period="M"):
     for month.
 
     """
-    ts = (
-        data.assign(
-            time=lambda x: pd.to_datetime(x[ts_index], format=date_format).dt.to_period(
-                time_period
-            )
-        )
-        .groupby([ts_index], as_index=False)
-        .agg({"admission": "sum"})
-        .set_index([ts_index])
-        .sort_index()
-    )
 
-    ts.index = ts.index.to_timestamp()
+    with stage("summarise"):
+
+        ## Group on parsed period codes rather than on the raw labels ----
+        periods = encode_periods(data[ts_index], date_format, time_period)
+
+        ### Sum in float64, as narrow integer counts would overflow ----
+        admission = data["admission"].astype("float64")
+
+        ts = admission.groupby(periods, sort=True).sum()
+        ts = ts[ts.index != NAT_CODE].to_frame()
+
+        ts.index = decode_periods(ts.index, time_period).to_timestamp()
+        ts.index.name = ts_index
 
     return ts
 
 
+# ==============================================================================
+#        FUNCTION SUMMARISE ADMISSIONS OF ALL ANALYSIS UNITS IN ONE PASS
+# ==============================================================================
+
+
+def summarise_by_unit(
+    data, ts_index, analysis_unit, date_format="%B %Y", time_period="M"
+):
+    """
+    Summarise admissions of every analysis unit into a time-series panel with a
+    single grouped pass over the data.
+
+    Parameters
+
+    ----------
+    data : Admissions data to be summarised for downstream analysis
+
+    ts_index : str
+    A variable to be used to set DateTimeIndex.
+
+    analysis_unit: str or list of str
+    The variable(s) defining the analysis units, e.g. "province".
+
+    date_format: str
+    The date format expressed in your data.
+
+    time_period: str
+    Whether monthl-, week-, day, quarter-based admissions. Defaults to "M"
+    for month.
+
+    Returns
+    A DataFrame with a MultiIndex of analysis unit(s) and time, holding the
+    summed admissions of each unit and period.
+    """
+
+    ## Group keys: analysis unit(s) followed by the period code ----
+    if isinstance(analysis_unit, str):
+        analysis_unit = [analysis_unit]
+
+    with stage("summarise"):
+        periods = pd.Series(
+            encode_periods(data[ts_index], date_format, time_period),
+            index=data.index,
+            name=ts_index,
+        )
+
+        ### Sum in float64, as narrow integer counts would overflow ----
+        panel = (
+            data[[*analysis_unit, "admission"]]
+            .astype({"admission": "float64"})
+            .groupby([*analysis_unit, periods], sort=True, observed=True)
+            .agg({"admission": "sum"})
+        )
+
+        ## Drop missing periods and turn codes into timestamps ----
+        codes = panel.index.get_level_values(ts_index)
+        panel = panel[codes != NAT_CODE]
+        panel.index = panel.index.remove_unused_levels()
+        panel.index = panel.index.set_levels(
+            decode_periods(panel.index.levels[-1], time_period).to_timestamp(),
+            level=-1,
+        )
+
+    return panel.sort_index()
+
+
+def split_panel(panel):
+    """
+    Split a panel returned by `summarise_by_unit()` into one time-series
+    DataFrame per analysis unit.
+
+    Parameters
+
+    ----------
+    panel : A DataFrame returned by `summarise_by_unit()`.
+
+    Returns
+    A dictionary of analysis unit to its time-series DataFrame.
+    """
+
+    unit_levels = list(range(panel.index.nlevels - 1))
+    key = unit_levels[0] if len(unit_levels) == 1 else unit_levels
+
+    return {
+        unit: ts.droplevel(unit_levels)
+        for unit, ts in panel.groupby(level=key, sort=False)
+    }
+
+
 # ==============================================================================
 #                       FUNCTION TO MAKE A TIME PLOT
 # ==============================================================================
 
 
-def create_time_plot(data, start, end, disease="ARI", time="M"):
+def create_time_plot(data, start, end, disease="ARI", time="M", ax=None):
     """
     Plot a seasonal subseries (one line per year) from an STL decomposition.
 
@@ -107,8 +479,12 @@ def create_time_plot(data, start, end, disease="ARI", time="M"):
     Whether monthl-, week-, day, quarter-based admissions. Defaults to "M"
     for month.
 
+    ax: matplotlib Axes
+    Axes to draw on, e.g. for batch rendering. Defaults to a new figure.
+
     """
     plot = data.plot(
+        ax=ax,
         kind="line",
         title=f"Admission of {disease} from {start} to {end}",
         ylabel="# of cases",
@@ -127,7 +503,7 @@ def create_time_plot(data, start, end, disease="ARI", time="M"):
 # ==============================================================================
 
 
-def plot_seasonal_subseries(decomposed, disease_name=""):
+def plot_seasonal_subseries(decomposed, disease_name="", ax=None):
     """
     Plot a seasonal subseries (one line per year) from an STL decomposition.
 
@@ -139,6 +515,9 @@ def plot_seasonal_subseries(decomposed, disease_name=""):
 
     disease_name : str
         Name of the disease to extract (optional if already sliced).
+
+    ax : matplotlib Axes
+        Axes to draw on, e.g. for batch rendering. Defaults to a new figure.
     """
 
     ## Extract seasonal component ----
@@ -168,6 +547,7 @@ def plot_seasonal_subseries(decomposed, disease_name=""):
 
     ## Plot ----
     ax = pivot.plot(
+        ax=ax,
         figsize=(12, 6.5),
         title=f"Seasonal Component by Year — {disease_name}",
         xlabel="Time [M]",
@@ -178,6 +558,455 @@ def plot_seasonal_subseries(decomposed, disease_name=""):
     return ax
 
 
+# ==============================================================================
+#                 FUNCTION TO DECOMPOSE A SINGLE TIME SERIES
+# ==============================================================================
+
+## Seasonal periods per `frequency` when `period` is not given. Daily series
+## have weekly as well as yearly cycles ----
+SEASONAL_PERIODS = {"Q": 4, "M": 12, "W": 52, "D": (7, 365)}
+
+
+def _resolve_period(period, frequency="M"):
+    """`period`, or the seasonal period(s) of `frequency` when it is None."""
+
+    if period is not None:
+        return period
+    if frequency not in SEASONAL_PERIODS:
+        raise ValueError(
+            f"period must be given for frequency {frequency!r}; defaults exist "
+            f"for {', '.join(SEASONAL_PERIODS)}"
+        )
+
+    return SEASONAL_PERIODS[frequency]
+
+
+def _box_cox_decision(series, decompose):
+    """
+    Box-Cox-transform `series[decompose]` into a "box_coxed" column and decide
+    whether the transformed data should be decomposed.
+
+    Returns a `(lmbda, transform)` tuple.
+    """
+
+    ### Heavy dependencies are only loaded once decomposition starts ----
+    from scipy.stats import boxcox
+
+    ### Estimate lamba and its 95% confidence intervals ----
+    with stage("boxcox"):
+        series["box_coxed"], lmbda, ci = boxcox(
+            x=series[decompose], lmbda=None, alpha=0.05
+        )
+
+    ### Decide whether to transform ----
+    ci_contains_1 = ci[0] <= 1 <= ci[1]
+
+    return lmbda, not ci_contains_1
+
+
+def _back_transform(decomposed, lmbda):
+    """
+    Reverse the Box-Cox transformation of every component, each on its own.
+    The back-transform is not additive: a back-transformed "seasonal" is not
+    the sum of the back-transformed "seasonal_<period>" columns.
+    """
+
+    from scipy.special import inv_boxcox
+
+    ### Multi-seasonal results are already DataFrames of components ----
+    if isinstance(decomposed, pd.DataFrame):
+        return pd.DataFrame(
+            inv_boxcox(decomposed.to_numpy(), lmbda),
+            index=decomposed.index,
+            columns=decomposed.columns,
+        )
+
+    return pd.DataFrame(
+        {
+            "observed": inv_boxcox(decomposed.observed, lmbda),
+            "trend": inv_boxcox(decomposed.trend, lmbda),
+            "seasonal": inv_boxcox(decomposed.seasonal, lmbda),
+            "resid": inv_boxcox(decomposed.resid, lmbda),
+        }
+    )
+
+
+def _multi_seasonal_frame(decomposed, periods):
+    """
+    Flatten a multi-seasonal DecomposeResult into a DataFrame of the four
+    usual components, "seasonal" being the sum of the seasonalities, followed
+    by one "seasonal_<period>" column per period. The sum holds on the scale
+    of the decomposition, not after `_back_transform()`.
+    """
+
+    ### MSTL squeezes a single remaining period into a Series ----
+    seasonals = decomposed.seasonal
+    if seasonals.ndim == 1:
+        seasonals = seasonals.to_frame(f"seasonal_{periods[0]}")
+
+    return pd.DataFrame(
+        {
+            "observed": decomposed.observed,
+            "trend": decomposed.trend,
+            "seasonal": seasonals.sum(axis=1),
+            "resid": decomposed.resid,
+        }
+    ).join(seasonals)
+
+
+def _as_decompose_result(endog, fit, row):
+    """
+    Wrap one row of a `batch_stl()` fit as a statsmodels DecomposeResult, or
+    one row of a `batch_mstl()` fit as a multi-seasonal DataFrame.
+    """
+
+    from statsmodels.tsa.seasonal import DecomposeResult
+
+    index = endog.index
+
+    if fit["seasonal"].ndim == 3:
+        seasonal = pd.DataFrame(
+            fit["seasonal"][row],
+            index=index,
+            columns=[f"seasonal_{period}" for period in fit["periods"]],
+        )
+    else:
+        seasonal = pd.Series(fit["seasonal"][row], index=index, name="season")
+
+    decomposed = DecomposeResult(
+        endog,
+        seasonal,
+        pd.Series(fit["trend"][row], index=index, name="trend"),
+        pd.Series(fit["resid"][row], index=index, name="resid"),
+        pd.Series(fit["weights"][row], index=index, name="robust_weight"),
+    )
+
+    if seasonal.ndim == 2:
+        return _multi_seasonal_frame(decomposed, fit["periods"])
+
+    return decomposed
+
+
+def _fit_batch(values, seasonal, period, **fit_kwargs):
+    """`batch_stl()` for a single period, `batch_mstl()` for a sequence."""
+
+    if np.ndim(period):
+        return batch_mstl(values, period, seasonal, **fit_kwargs)
+
+    return batch_stl(values, period, seasonal, **fit_kwargs)
+
+
+def _check_fit_options(backend, tol):
+    """Reject fit options the chosen backend does not implement."""
+
+    if tol is not None and backend != "batch":
+        raise ValueError("tol (early stopping) requires backend='batch'")
+
+
+def _fit_stl(
+    endog,
+    seasonal,
+    period,
+    backend="statsmodels",
+    robust=False,
+    inner_iter=None,
+    outer_iter=None,
+    tol=None,
+    trend=None,
+):
+    """
+    Fit STL to a single series with the requested backend, or MSTL when
+    `period` is a sequence of periods. `trend` is the length of the trend
+    smoother, None for the statsmodels default.
+
+    Returns a `(decomposed, iterations)` tuple, `iterations` being the number
+    of outer (robustness) iterations run.
+    """
+
+    if backend == "statsmodels":
+        from statsmodels.tsa.seasonal import MSTL, STL
+
+        ### statsmodels always runs the full outer loop ----
+        iterations = outer_iter if outer_iter is not None else (15 if robust else 0)
+
+        with stage("stl"):
+            if not np.ndim(period):
+                fit = STL(
+                    endog, seasonal=seasonal, period=period, trend=trend, robust=robust
+                ).fit(inner_iter=inner_iter, outer_iter=outer_iter)
+                return fit, iterations
+
+            periods, windows = mstl_settings(period, seasonal, len(endog))
+            fit = MSTL(
+                endog,
+                periods=periods,
+                windows=windows,
+                stl_kwargs={
+                    "trend": trend,
+                    "robust": robust,
+                    "inner_iter": inner_iter,
+                    "outer_iter": outer_iter,
+                },
+            ).fit()
+            return _multi_seasonal_frame(fit, periods), iterations
+    elif backend == "batch":
+        with stage("stl"):
+            fit = _fit_batch(
+                endog,
+                seasonal,
+                period,
+                trend=trend,
+                robust=robust,
+                inner_iter=inner_iter,
+                outer_iter=outer_iter,
+                tol=tol,
+            )
+        return _as_decompose_result(endog, fit, 0), int(fit["iterations"][0])
+    else:
+        raise ValueError("backend must be 'statsmodels' or 'batch'")
+
+
+def decompose_series(
+    series,
+    decompose,
+    seasonal,
+    period,
+    backend="statsmodels",
+    robust=False,
+    inner_iter=None,
+    outer_iter=None,
+    tol=None,
+    trend=None,
+):
+    """
+    Decompose a single time series with Box-Cox decision.
+
+    Parameters
+
+    ----------
+    series : A time-series DataFrame returned by `summarise_disease()`.
+
+    decompose: str
+        A variable name holding the phenomenon to be decomposed.
+
+    seasonal: int
+        Length of the seasonal smoother. It should be >= 7. With several
+        periods, one length per period, a single length for all, or None for
+        the MSTL defaults.
+
+    period: int or sequence of int
+        Periodicity of the sequence of the phenomenon to be decomposed. A
+        sequence, e.g. (7, 365) for daily admissions, fits MSTL with one
+        seasonal component per period.
+
+    backend: str
+        "statsmodels" (default) or "batch" for the vectorized engine in
+        `modules.batch_stl`.
+
+    robust: bool
+        Whether to fit robust STL, down-weighting outliers such as outbreak
+        spikes and reporting artefacts in the trend and seasonal smoothers.
+
+    inner_iter, outer_iter: int
+        Iterations of the inner and outer (robustness) loops. Default to 2 and
+        15 when robust, 5 and 0 otherwise.
+
+    tol: float
+        With backend "batch", stop the outer loop once the robustness weights
+        change by at most `tol` on average between two iterations, e.g. 1e-3.
+
+    trend: int
+        Length of the trend smoother, odd and greater than `period`. None
+        (default) uses the statsmodels default derived from `seasonal`.
+
+    Returns
+    The STL result when the 95% confidence interval of the Box-Cox lambda
+    contains 1, otherwise a DataFrame of the back-transformed components.
+    Multi-seasonal results are always DataFrames, with "seasonal" holding the
+    combined seasonality and one "seasonal_<period>" column per period.
+    "seasonal" is the sum of those columns on the scale the series was
+    decomposed on; back-transformed results hold every column back-transformed
+    on its own, so the sum only holds after `DecompositionPanel.model_scale()`.
+    """
+
+    _check_fit_options(backend, tol)
+
+    decomposed, lmbda, transform, _ = _decompose_with_lambda(
+        series,
+        decompose,
+        seasonal,
+        period,
+        backend,
+        robust=robust,
+        inner_iter=inner_iter,
+        outer_iter=outer_iter,
+        tol=tol,
+        trend=trend,
+    )
+
+    return _back_transform(decomposed, lmbda) if transform else decomposed
+
+
+def _decompose_with_lambda(
+    series, decompose, seasonal, period, backend="statsmodels", **fit_kwargs
+):
+    """
+    `decompose_series()` also returning the Box-Cox lambda, whether the
+    series was decomposed on the transformed scale and the number of outer
+    iterations run. `fit_kwargs` are the robust settings of `_fit_stl()`.
+
+    Returns a `(decomposed, lmbda, transform, iterations)` tuple, where
+    `decomposed` is on the scale it was fitted on; transformed results are
+    left for the caller to pass to `_back_transform()`.
+    """
+
+    lmbda, transform = _box_cox_decision(series, decompose)
+
+    if not transform:
+        decomposed, iterations = _fit_stl(
+            series[decompose], seasonal, period, backend, **fit_kwargs
+        )
+
+        ### Return trend ----
+        return decomposed, lmbda, transform, iterations
+
+    else:
+        ### Decompose Box-Cox-transformed data ----
+        decomposed, iterations = _fit_stl(
+            series.box_coxed, seasonal, period, backend, **fit_kwargs
+        )
+
+        return decomposed, lmbda, transform, iterations
+
+
+def _decompose_unit(
+    item, decompose, seasonal, period, backend="statsmodels", **fit_kwargs
+):
+    """
+    Decompose one analysis unit, given as a `(unit, ts)` pair whose series
+    passed the checks of `validate_panel()`.
+
+    Returns a `(decomposed, lmbda, transform, iterations)` tuple, `decomposed`
+    being on the Box-Cox scale when `transform` is True. Kept at module level
+    so that it can be shipped to worker processes.
+    """
+
+    unit, ts = item
+
+    with stage("decompose", unit):
+        return _decompose_with_lambda(ts, decompose, seasonal, period, backend, **fit_kwargs)
+
+
+def _prepare_unit(item, decompose):
+    """
+    Box-Cox decision of one `(unit, ts)` pair whose series passed the checks
+    of `validate_panel()`.
+
+    Returns a `(endog, lmbda, transform)` tuple, where `endog` is the series
+    to be decomposed.
+    """
+
+    unit, ts = item
+
+    with stage("prepare", unit):
+        lmbda, transform = _box_cox_decision(ts, decompose)
+        endog = ts["box_coxed"] if transform else ts[decompose]
+
+    return endog, lmbda, transform
+
+
+def _decompose_units_batched(items, decompose, seasonal, period, **fit_kwargs):
+    """
+    Decompose several `(unit, ts)` pairs with `batch_stl()`, stacking units that
+    share a time index into one matrix.
+
+    Returns a list of `(decomposed, lmbda, transform, iterations)` tuples in
+    the order of `items`, as `_decompose_unit()` does.
+    """
+
+    prepared = [_prepare_unit(item, decompose) for item in items]
+
+    ## Group units sharing the same time index ----
+    groups = {}
+    for i, (endog, *_) in enumerate(prepared):
+        groups.setdefault(endog.index.to_numpy().tobytes(), []).append(i)
+
+    outputs = [None] * len(items)
+
+    for members in groups.values():
+        values = np.vstack([prepared[i][0].to_numpy(dtype="float64") for i in members])
+        with stage("stl"):
+            fit = _fit_batch(values, seasonal, period, **fit_kwargs)
+
+        for row, i in enumerate(members):
+            endog, lmbda, transform = prepared[i]
+            decomposed = _as_decompose_result(endog, fit, row)
+            outputs[i] = (decomposed, lmbda, transform, int(fit["iterations"][row]))
+
+    return outputs
+
+
+def _decompose_task(task, decompose, period, backend):
+    """
+    Decompose a `(settings, items)` task of `apply_stl_decomposition()`: the
+    `(unit, ts)` pairs in `items` sharing one dictionary of settings. Runs in
+    a worker.
+
+    Returns a list of `_decompose_unit()` outputs in the order of `items`.
+    """
+
+    settings, items = task
+    settings = dict(settings)
+    seasonal = settings.pop("seasonal")
+
+    if backend == "batch":
+        return _decompose_units_batched(items, decompose, seasonal, period, **settings)
+
+    return [
+        _decompose_unit(item, decompose, seasonal, period, backend, **settings)
+        for item in items
+    ]
+
+
+# ==============================================================================
+#               FUNCTION TO MAP A FUNCTION OVER ANALYSIS UNITS
+# ==============================================================================
+
+
+def map_units(func, items, n_jobs=1, executor=None):
+    """
+    Apply `func` to every item, sequentially or on a process pool, keeping the
+    order of `items` in the returned list.
+
+    Parameters
+
+    ----------
+    func : A picklable callable, e.g. a module-level function or a partial.
+
+    items : The per-unit inputs.
+
+    n_jobs: int
+    Number of worker processes. Defaults to 1 (sequential); -1 or None uses
+    all cores.
+
+    executor: concurrent.futures.Executor
+    An already running executor to use instead of starting a process pool.
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    if not items:
+        return []
+    if executor is not None:
+        return list(executor.map(func, items))
+    if n_jobs == 1:
+        return [func(item) for item in items]
+
+    max_workers = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
 # ==============================================================================
 #                      FUNCTION TO APPLY STL DECOMPOSITION
 # ==============================================================================
@@ -192,7 +1021,20 @@ def apply_stl_decomposition(
     scope="single",
     date_format="%B %Y", 
     frequency="M",
-    analysis_unit=""
+    analysis_unit="",
+    n_jobs=1,
+    executor=None,
+    cache=None,
+    backend="statsmodels",
+    output="dict",
+    robust=False,
+    inner_iter=None,
+    outer_iter=None,
+    tol=None,
+    summarised=False,
+    trend=None,
+    params=None,
+    return_report=False,
 ):
     """
     Apply STL decomposition dynamically
@@ -200,102 +1042,253 @@ def apply_stl_decomposition(
     Parameters
     ----------
     data: DataFrame to be decomposed, returned by `summarise_admissions()`.
+    With `summarised=True`, admission series already summed per period.
 
     decompose: str
         A variable name holding the phenomenon to be decomposed.
 
     seasonal: int
-        Length of the seasonal smoother. It should be >= 7.
+        Length of the seasonal smoother. It should be >= 7. With several
+        periods, one length per period, a single length for all, or None for
+        the MSTL defaults.
 
-    period: int
-        Periodicity of the sequence of the phenomenon to be decomposed.
+    period: int or sequence of int
+        Periodicity of the sequence of the phenomenon to be decomposed. A
+        sequence fits MSTL with one seasonal component per period. None uses
+        `SEASONAL_PERIODS[frequency]`, i.e. 12 for "M", 52 for "W" and
+        (7, 365) for "D".
 
     scope: str
         The scope of the decomposition. Whether a single-area or multiple-area 
         decomposition.
-    """
-
-    ## ---- Helper function to comply with DRY ---------------------------------
-
-    def decompose_series(series):
-        """Decompose a single time series with Box-Cox decision."""
-
-        ### Estimate lamba and its 95% confidence intervals ----
-        series["box_coxed"], lmbda, ci = boxcox(x=series[decompose], lmbda=None, alpha=0.05)
 
-        ### Decide whether to transform ----
-        ci_contains_1 = ci[0] <= 1 <= ci[1]
-
-        if ci_contains_1:
-            decomposed = STL(
-                series[decompose], seasonal=seasonal, period=period, robust=False
-            ).fit()
-
-            ### Return trend ----
-            return decomposed
-
-        else:
-            ### Decompose Box-Cox-transformed data ----
-            decomposed = STL(
-                series.box_coxed, seasonal=seasonal, period=period, robust=False
-            ).fit()
-
-            ### Reverse transformation to original scale ----
-            decomposed = pd.DataFrame(
-                {
-                    "observed": inv_boxcox(decomposed.observed, lmbda),
-                    "trend": inv_boxcox(decomposed.trend, lmbda),
-                    "seasonal": inv_boxcox(decomposed.seasonal, lmbda),
-                    "resid": inv_boxcox(decomposed.resid, lmbda),
-                }
-            )
+    n_jobs: int
+        Number of worker processes used to decompose the analysis units when
+        scope is 'multiple'. Defaults to 1 (sequential); -1 uses all cores.
+
+    executor: concurrent.futures.Executor
+        An already running executor to submit the per-unit decompositions to,
+        instead of starting a process pool from `n_jobs`.
+
+    cache: DecompositionCache
+        An on-disk cache from `modules.decompose_cache`. Series decomposed
+        before with the same settings are loaded rather than decomposed.
+
+    backend: str
+        "statsmodels" (default) fits STL series by series. "batch" uses the
+        vectorized engine in `modules.batch_stl`, which decomposes all units
+        sharing a time index in one call; with `n_jobs` > 1 the units are split
+        into one batch per worker.
+
+    output: str
+        For scope 'multiple', "dict" (default) returns a dictionary of
+        analysis unit to result; "panel" returns a `DecompositionPanel`
+        that also records each unit's Box-Cox lambda, transform decision and
+        the number of outer iterations its fit ran.
+
+    robust: bool
+        Whether to fit robust STL, so that outbreak spikes and reporting
+        artefacts do not distort the trend.
+
+    inner_iter, outer_iter: int
+        Iterations of the inner and outer (robustness) loops. Default to 2 and
+        15 when robust, 5 and 0 otherwise.
+
+    tol: float
+        With backend "batch", stop the outer loop of a unit once its
+        robustness weights change by at most `tol` on average between two
+        iterations, e.g. 1e-3. Units that converge early are left out of the
+        remaining iterations of their batch.
+
+    summarised: bool
+        Whether `data` already holds the series, e.g. from
+        `AdmissionCube.to_panel()`: a DataFrame indexed by time for scope
+        'single', or a panel in the layout of `summarise_by_unit()` for scope
+        'multiple', whose unit level(s) define the analysis units.
+
+    trend: int
+        Length of the trend smoother, odd and greater than `period`. None
+        (default) uses the statsmodels default derived from `seasonal`.
+
+    params: dict
+        For scope 'multiple', analysis unit to the settings its series is
+        decomposed with instead of the arguments above: any of "seasonal",
+        "trend", "robust", "inner_iter", "outer_iter" and "tol", e.g. the
+        first item returned by `modules.tuning.tune_stl()`. Units without
+        an entry use the arguments.
+
+    return_report: bool
+        For scope 'multiple', also return the pre-flight report of
+        `validate_panel()`. Every unit is checked before decomposition:
+        units with gaps, missing or non-positive values are imputed up
+        front, and units too short or constant are skipped with a warning
+        instead of failing the whole run.
+    """
 
-            ### Return trend ----
-            return decomposed
+    period = _resolve_period(period, frequency)
+    _check_fit_options(backend, tol)
+
+    fit_kwargs = {
+        "trend": trend,
+        "robust": robust,
+        "inner_iter": inner_iter,
+        "outer_iter": outer_iter,
+        "tol": tol,
+    }
+
+    ## Settings the cached results depend on, besides the series itself ----
+    cache_params = {
+        "seasonal": seasonal,
+        "period": period,
+        **fit_kwargs,
+        "boxcox_alpha": 0.05,
+        "scope": scope,
+        "backend": backend,
+        "format": 6,
+    }
 
     ## ---- Single-area decomposition ------------------------------------------
 
     if scope == "single":
 
         ### Summarise data and make a time-series object ----
-        ts = summarise_disease(data, index, date_format, frequency)
+        if summarised:
+            ts = data.copy()
+            if isinstance(ts.index, pd.MultiIndex):
+                if len(split_panel(ts)) != 1:
+                    raise ValueError("scope 'single' needs the series of a single unit.")
+                ts = ts.droplevel(list(range(ts.index.nlevels - 1)))
+        else:
+            ts = summarise_disease(data, index, date_format, frequency)
+
+        ### Reuse a cached decomposition, if any ----
+        if cache is not None:
+            key = cache.key(ts[decompose], **cache_params)
+            decomposed = cache.get(key)
+            if decomposed is None:
+                decomposed = decompose_series(
+                    ts, decompose, seasonal, period, backend, **fit_kwargs
+                )
+                cache.put(key, decomposed)
+            return decomposed
 
         ### Decompose and return ----
-        return decompose_series(ts)
+        return decompose_series(ts, decompose, seasonal, period, backend, **fit_kwargs)
 
-    ## ---- Single-area decomposition ------------------------------------------
+    ## ---- Multiple-area decomposition ----------------------------------------
 
     elif scope == "multiple":
-        if analysis_unit is None:
+        if analysis_unit is None and not summarised:
             raise ValueError("analysis_unit must be provided for multiple-area scope.")
 
-        ### List of unique analysis units ----
-        units = data[analysis_unit].unique()
-
-        ### Initialise results container ----
-        results = {}
-
-        ### Loop over ----
-        for unit in units:
-            subset = data.query(f"{analysis_unit} == @unit")
-
-            #### Summarise data and make a time-series object ----
-            ts = summarise_disease(subset, index, date_format, frequency)
+        ### Summarise all units in one pass and slice the panel ----
+        if summarised:
+            by_unit = split_panel(data)
+            if not analysis_unit:
+                analysis_unit = list(data.index.names[:-1])
+        else:
+            panel = summarise_by_unit(data, index, analysis_unit, date_format, frequency)
+            by_unit = split_panel(panel)
+
+        ### Pre-flight checks of every unit in one pass ----
+        repaired, report = _preflight_units(
+            by_unit,
+            decompose,
+            period,
+            frequency,
+            panel=data if summarised else panel,
+        )
+        strategy = dict(zip(report.index, report["strategy"]))
+        units = list(repaired)
+        series = list(repaired.values())
+
+        ### Settings of every unit: the arguments, overridden by `params` ----
+        params = params or {}
+        unknown = {key for settings in params.values() for key in settings} - {
+            "seasonal",
+            *fit_kwargs,
+        }
+        if unknown:
+            raise ValueError(f"Unknown settings in params: {sorted(unknown)}")
+
+        unit_settings = [
+            {"seasonal": seasonal, **fit_kwargs, **params.get(unit, {})} for unit in units
+        ]
+        for settings in unit_settings:
+            _check_fit_options(backend, settings["tol"])
+
+        ### Reuse cached decompositions, if any ----
+        if cache is not None:
+            keys = [
+                cache.key(ts[decompose], **{**cache_params, **settings})
+                for ts, settings in zip(series, unit_settings)
+            ]
+            decomposed = [cache.get(key) for key in keys]
+        else:
+            decomposed = [None] * len(series)
+
+        pending = [i for i, result in enumerate(decomposed) if result is None]
+
+        ### Units sharing their settings are decomposed together ----
+        groups = {}
+        for i in pending:
+            groups.setdefault(repr(sorted(unit_settings[i].items())), []).append(i)
+
+        ### One task per unit, or per chunk of a group with backend "batch",
+        ### carrying its settings so that one pool serves every group ----
+        if backend not in ("statsmodels", "batch"):
+            raise ValueError("backend must be 'statsmodels' or 'batch'")
+
+        n_chunks = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+        tasks = [
+            (unit_settings[chunk[0]], [(units[i], series[i]) for i in chunk])
+            for members in groups.values()
+            for chunk in (
+                np.array_split(members, min(n_chunks, len(members)))
+                if backend == "batch"
+                else [[i] for i in members]
+            )
+        ]
+        order = [i for members in groups.values() for i in members]
 
-            #### Decompose and return ----
-            try:
-                results[unit] = decompose_series(ts)
-            except ValueError:
-                print(
-                    f"""
-                    \nMissing values have been detected in {unit} {analysis_unit.title()}, \nand were handled using univariate ffill imputation
-                    """
-                )
-                ts[decompose] = ts[decompose].replace({0: np.nan})
-                ts[decompose] = ts[decompose].ffill()
-                results[unit] = decompose_series(ts)
+        ### Decompose the remaining units sequentially or on a process pool ----
+        decompose_task = partial(
+            _decompose_task, decompose=decompose, period=period, backend=backend
+        )
+        outputs = [
+            unit_output
+            for task_outputs in map_units(decompose_task, tasks, n_jobs, executor)
+            for unit_output in task_outputs
+        ]
+
+        for i, unit_output in zip(order, outputs):
+            decomposed[i] = unit_output
+            if cache is not None:
+                cache.put(keys[i], unit_output)
+
+        ### Collect results in the order units appear in the data, on the
+        ### original scale ----
+        results = {
+            unit: _back_transform(out[0], out[1]) if out[2] else out[0]
+            for unit, out in zip(units, decomposed)
+        }
+        imputed = {unit: strategy[unit] == "impute" for unit in units}
+
+        if output == "panel":
+            from modules.panel import DecompositionPanel
+
+            results = DecompositionPanel.from_results(
+                results,
+                lmbda={unit: out[1] for unit, out in zip(units, decomposed)},
+                transformed={unit: out[2] for unit, out in zip(units, decomposed)},
+                imputed=imputed,
+                iterations={unit: out[3] for unit, out in zip(units, decomposed)},
+                model={unit: out[0] for unit, out in zip(units, decomposed) if out[2]},
+            )
+        elif output != "dict":
+            raise ValueError("output must be 'dict' or 'panel'")
 
-        return results
+        return (results, report) if return_report else results
 
     else:
         raise ValueError("scope must be 'single' or 'multiple'")
@@ -327,23 +1320,103 @@ def pull_component_and_concatenate(dct, component):
 
     """
 
-    ## Initialise an empyt container for dfs ----
-    dfs = []
+    with stage("concatenate"):
+
+        ## Initialise an empyt container for dfs ----
+        dfs = []
+
+        ## Loop over a decomposed object ----
+        for province, stl_obj in dct.items():
+
+            ### Extract a user-defined component ----
+            series = getattr(stl_obj, component)
+
+            ### Convert to DataFrame and add province label ----
+            df = pd.DataFrame({
+                "province": province,
+                component: series
+            })
+
+            ### Append df ----
+            dfs.append(df)
+
+        ## Concatenate all provinces into one long DataFrame ----
+        return pd.concat(dfs, ignore_index=False)
+
+
+# ==============================================================================
+#         FUNCTION TO PULL ALL COMPONENTS OUT OF A DICT IN A SINGLE PASS
+# ==============================================================================
+
+COMPONENTS = ("observed", "trend", "seasonal", "resid")
+
+
+def pull_all_components(
+    dct, components=COMPONENTS, unit_name="province", as_array=False
+):
+    """
+    Pull out all components stored in a Province-wise dictionary returned by
+    `apply_stl_decomposition()` in a single pass, writing them into
+    preallocated arrays without intermediate per-unit DataFrames.
+
+    Parameters
+
+    ----------
+    dct: Dictionary object returned by `apply_stl_decomposition()`. Values may
+    be statsmodels `DecomposeResult` objects or back-transformed DataFrames.
+
+    components: tuple of str
+    The components to pull out. Defaults to all four.
+
+    unit_name: str
+    Name of the analysis-unit column of the tidy output.
+
+    as_array: bool
+    Whether to return a (unit, time, component) array instead of a tidy
+    DataFrame.
+
+    Returns
+    A long DataFrame indexed by time, with a categorical analysis-unit column
+    and one column per component. With `as_array=True`, a `(values, units,
+    times)` tuple, where `values` is a 3-D array over the union of the units'
+    time indexes, NaN where a unit has no observation. An empty dictionary
+    gives a `(0, 0, len(components))` array.
+    """
+
+    with stage("concatenate"):
+        units = pd.Index(list(dct.keys()), tupleize_cols=False)
+        indexes = [getattr(obj, components[0]).index for obj in dct.values()]
+        lengths = np.array([len(index) for index in indexes], dtype=int)
+
+        ## ---- 3-D (unit, time, component) array --------------------------------
+
+        if as_array:
+            times = indexes[0] if indexes else pd.DatetimeIndex([])
+            for index in indexes[1:]:
+                times = times.union(index)
+
+            values = np.full((len(units), len(times), len(components)), np.nan)
+            for u, (obj, index) in enumerate(zip(dct.values(), indexes)):
+                positions = times.get_indexer(index)
+                for c, component in enumerate(components):
+                    values[u, positions, c] = np.asarray(getattr(obj, component))
+
+            return values, units, times
+
+        ## ---- Tidy long DataFrame ----------------------------------------------
 
-    ## Loop over a decomposed object ----
-    for province, stl_obj in dct.items():
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        values = np.empty((ends[-1] if len(ends) else 0, len(components)))
 
-        ### Extract a user-defined component ----
-        series = getattr(stl_obj, component)
+        for obj, start, end in zip(dct.values(), starts, ends):
+            for c, component in enumerate(components):
+                values[start:end, c] = np.asarray(getattr(obj, component))
 
-        ### Convert to DataFrame and add province label ----
-        df = pd.DataFrame({
-            "province": province,
-            component: series
-        })
+        times = indexes[0].append(indexes[1:]) if indexes else pd.DatetimeIndex([])
+        codes = np.repeat(np.arange(len(units)), lengths)
 
-        ### Append df ----
-        dfs.append(df)
+        tidy = pd.DataFrame(values, index=times, columns=list(components))
+        tidy.insert(0, unit_name, pd.Categorical.from_codes(codes, categories=units))
 
-    ## Concatenate all provinces into one long DataFrame ----
-    return pd.concat(dfs, ignore_index=False)
+        return tidy
@@ -0,0 +1,219 @@
+import warnings
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from modules.decompose_disease import (
+    _resolve_period,
+    decode_periods,
+    encode_periods,
+    map_units,
+)
+from modules.instrument import stage
+from modules.panel import DecompositionPanel
+
+# ==============================================================================
+#            FUNCTIONS TO FORECAST SEASONALLY ADJUSTED SERIES IN BATCH
+# ==============================================================================
+
+
+def _drift_forecast(adjusted, first, last, horizon, drift=True):
+    """
+    Random walk forecasts, with or without drift, of every row of a
+    (units, times) array observed from `first` to `last`.
+
+    Returns `(mean, scale)` arrays of shape (units, horizon), where `scale` is
+    the standard deviation of the forecast errors at each step.
+    """
+
+    rows = np.arange(len(adjusted))
+    h = np.arange(1, horizon + 1)
+    n = (last - first).astype("float64")
+
+    y_last = adjusted[rows, last]
+    slope = (y_last - adjusted[rows, first]) / n if drift else np.zeros(len(rows))
+
+    ### Residual spread of the one-step fits ----
+    steps = np.diff(adjusted, axis=1) - slope[:, None]
+    sigma = np.sqrt(np.nansum(steps**2, axis=1) / (n - drift))
+
+    mean = y_last[:, None] + slope[:, None] * h
+    spread = h * (1 + h / n[:, None]) if drift else h * np.ones_like(n)[:, None]
+
+    return mean, sigma[:, None] * np.sqrt(spread)
+
+
+def _arima_forecast(adjusted, horizon, order):
+    """ARIMA forecast of one seasonally adjusted series; runs in a worker."""
+
+    from statsmodels.tsa.arima.model import ARIMA
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fitted = ARIMA(adjusted, order=order).fit()
+
+    forecast = fitted.get_forecast(horizon)
+
+    return np.asarray(forecast.predicted_mean), np.sqrt(np.asarray(forecast.var_pred_mean))
+
+
+def _seasonal_naive(seasonal, last, horizon, period):
+    """Repeat the last full cycle of every row's seasonal component."""
+
+    rows = np.arange(len(seasonal))[:, None]
+    h = np.arange(horizon)
+
+    return seasonal[rows, last[:, None] - period + 1 + h % period]
+
+
+# ==============================================================================
+#               FUNCTION TO FORECAST ADMISSIONS OF EVERY ANALYSIS UNIT
+# ==============================================================================
+
+
+def forecast_units(
+    results,
+    horizon=6,
+    method="drift",
+    period=None,
+    frequency="M",
+    level=95,
+    order=(1, 1, 0),
+    n_jobs=1,
+    unit_name="unit",
+):
+    """
+    Forecast admissions of every analysis unit from its STL decomposition.
+
+    The seasonally adjusted series (trend plus remainder) is forecast and the
+    seasonal component of the last cycle is added back. Units decomposed on
+    the Box-Cox scale are forecast on that scale and back-transformed with
+    their own lambda.
+
+    Parameters
+    ----------
+    results: DecompositionPanel or dict
+        Decompositions returned by `apply_stl_decomposition(scope="multiple")`;
+        see `DecompositionPanel.require_lambdas()` for back-transformed units.
+
+    horizon: int
+        Number of periods to forecast.
+
+    method: str
+        Forecast of the seasonally adjusted series: "drift" (random walk with
+        drift, default) or "naive" (random walk), computed for all units at
+        once, or "arima", fitted unit by unit.
+
+    period: int or sequence of int
+        Seasonal period(s) of the decomposition. None uses those of
+        `frequency`. Multi-seasonal results use their "seasonal_<period>"
+        components, each repeated over its own period.
+
+    frequency: str
+        Period frequency of the series, e.g. "M".
+
+    level: float
+        Coverage of the prediction intervals, in percent.
+
+    order: tuple of int
+        ARIMA (p, d, q) order for method "arima".
+
+    n_jobs: int
+        Number of worker processes fitting ARIMA models.
+
+    unit_name: str or list of str
+        Name of the unit column, or one name per level of tuple units.
+
+    Returns
+    A tidy DataFrame with one row per unit and forecast period, holding the
+    horizon, the point forecast and the lower and upper bounds of the
+    prediction interval. Forecasts are floored at zero, on the original scale
+    or, for back-transformed units, at the lower bound of the Box-Cox scale.
+    """
+
+    panel = (
+        results
+        if isinstance(results, DecompositionPanel)
+        else DecompositionPanel.from_results(results)
+    )
+
+    panel.require_lambdas()
+
+    ## Seasonal components and the period each one repeats over ----
+    seasonal_periods = [
+        (c, int(c.split("_", 1)[1]))
+        for c in panel.components
+        if c.startswith("seasonal_")
+    ]
+    if not seasonal_periods:
+        periods = _resolve_period(period, frequency)
+        if not isinstance(periods, int):
+            raise ValueError("Multi-seasonal forecasts need seasonal_<period> components.")
+        seasonal_periods = [("seasonal", periods)]
+
+    from scipy.special import inv_boxcox
+    from scipy.stats import norm
+
+    with stage("forecast"):
+
+        ### Work on the Box-Cox scale of transformed units ----
+        lambdas = np.where(panel.transformed, panel.lmbda, np.nan)[:, None]
+        observed = panel.model_scale("observed")
+        seasonals = [(panel.model_scale(c), p) for c, p in seasonal_periods]
+        adjusted = observed - sum(values for values, _ in seasonals)
+
+        ### First and last observed period of every unit ----
+        covered = ~np.isnan(observed)
+        first = covered.argmax(axis=1)
+        last = covered.shape[1] - 1 - covered[:, ::-1].argmax(axis=1)
+
+        ## ---- Seasonally adjusted forecasts ------------------------------------
+
+        if method in ("drift", "naive"):
+            mean, scale = _drift_forecast(adjusted, first, last, horizon, method == "drift")
+        elif method == "arima":
+            outputs = map_units(
+                partial(_arima_forecast, horizon=horizon, order=order),
+                [adjusted[u, first[u] : last[u] + 1] for u in range(len(adjusted))],
+                n_jobs,
+            )
+            mean = np.array([m for m, _ in outputs])
+            scale = np.array([s for _, s in outputs])
+        else:
+            raise ValueError("method must be 'drift', 'naive' or 'arima'")
+
+        ## ---- Add back the seasonality and leave the Box-Cox scale -------------
+
+        mean = mean + sum(_seasonal_naive(values, last, horizon, p) for values, p in seasonals)
+        z = norm.ppf(0.5 + level / 200)
+        bounds = {"forecast": mean, "lower": mean - z * scale, "upper": mean + z * scale}
+
+        ### Box-Cox values below -1/lambda (lambda > 0) stand for zero ----
+        with np.errstate(divide="ignore"):
+            floor = np.where(lambdas > 0, -1 / lambdas, -np.inf)
+
+        for name, values in bounds.items():
+            bounds[name] = np.where(
+                panel.transformed[:, None],
+                inv_boxcox(np.maximum(values, floor), lambdas),
+                np.clip(values, 0, None),
+            )
+
+        ### Forecast periods, following each unit's last observed period ----
+        codes = encode_periods(pd.Series(panel.times), time_period=frequency)
+        future = codes[last][:, None] + np.arange(1, horizon + 1)
+
+        n_units = len(panel.units)
+        tidy = pd.DataFrame(
+            {
+                panel.times.name or "time": decode_periods(future.ravel(), frequency).to_timestamp(),
+                "horizon": np.tile(np.arange(1, horizon + 1), n_units),
+                **{name: values.ravel() for name, values in bounds.items()},
+            }
+        )
+
+        units = np.repeat(np.arange(n_units), horizon)
+        tidy = panel.unit_columns(unit_name, units).join(tidy)
+
+    return tidy
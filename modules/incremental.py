@@ -0,0 +1,224 @@
+import pickle
+from functools import partial
+
+import pandas as pd
+
+from modules.decompose_cache import series_fingerprint
+from modules.decompose_disease import (
+    _back_transform,
+    _decompose_unit,
+    _preflight_units,
+    _resolve_period,
+    map_units,
+    split_panel,
+    summarise_by_unit,
+)
+
+# ==============================================================================
+#            FUNCTION TO BUILD THE STATE OF AN INCREMENTAL DECOMPOSITION
+# ==============================================================================
+
+
+def build_decomposition_state(
+    data,
+    decompose,
+    index,
+    seasonal,
+    period,
+    analysis_unit,
+    date_format="%B %Y",
+    frequency="M",
+    n_jobs=1,
+    executor=None,
+    robust=False,
+    inner_iter=None,
+    outer_iter=None,
+):
+    """
+    Decompose every analysis unit and keep what is needed to update the
+    decomposition when new periods arrive.
+
+    Parameters
+    ----------
+    data: Admissions data, as passed to `apply_stl_decomposition()`.
+
+    decompose: str
+        A variable name holding the phenomenon to be decomposed.
+
+    index: str
+        A variable to be used to set DateTimeIndex.
+
+    seasonal: int
+        Length of the seasonal smoother. It should be >= 7.
+
+    period: int or sequence of int
+        Periodicity of the sequence of the phenomenon to be decomposed, or
+        several periods for MSTL. None uses the periods of `frequency`.
+
+    analysis_unit: str or list of str
+        The variable(s) defining a series, e.g. ["province", "disease"].
+
+    n_jobs: int
+        Number of worker processes used to decompose the units.
+
+    robust, inner_iter, outer_iter:
+        Robust STL settings, see `decompose_series()`. They are kept in the
+        state and reused by every update.
+
+    Returns
+    A dictionary holding the settings, the summarised series, their
+    fingerprints, the decomposition of every unit and the pre-flight report
+    of `validate_panel()`.
+    """
+
+    state = {
+        "settings": {
+            "decompose": decompose,
+            "index": index,
+            "seasonal": seasonal,
+            "period": _resolve_period(period, frequency),
+            "analysis_unit": analysis_unit,
+            "date_format": date_format,
+            "frequency": frequency,
+            "robust": robust,
+            "inner_iter": inner_iter,
+            "outer_iter": outer_iter,
+        },
+        "series": {},
+        "fingerprints": {},
+        "results": {},
+        "imputed": set(),
+        "report": None,
+        "updated": [],
+    }
+
+    return update_decomposition_state(state, data, n_jobs, executor)
+
+
+# ==============================================================================
+#            FUNCTION TO UPDATE A DECOMPOSITION WITH NEW ADMISSIONS
+# ==============================================================================
+
+
+def update_decomposition_state(state, new_rows, n_jobs=1, executor=None):
+    """
+    Merge newly arrived admissions into a decomposition state and decompose
+    again only the units whose series changed.
+
+    Parameters
+    ----------
+    state: dict
+        A state returned by `build_decomposition_state()` or by a previous
+        call of this function. It is not modified.
+
+    new_rows: DataFrame
+        New admissions in the same layout as the data the state was built
+        from, typically one new month. A (unit, period) total present in
+        `new_rows` replaces the stored total of that period.
+
+    n_jobs: int
+        Number of worker processes used to decompose the changed units.
+
+    Returns
+    A new state. Its "updated" entry lists the units decomposed again. Changed
+    units pass the same pre-flight checks as in `apply_stl_decomposition()`:
+    units failing them are dropped from the results, units with gaps or
+    invalid values are repaired and marked as imputed, and the "report" entry
+    holds the latest checks of every unit.
+    """
+
+    settings = state["settings"]
+    decompose = settings["decompose"]
+
+    ## Summarise the new rows of every unit in one pass ----
+    panel = summarise_by_unit(
+        new_rows,
+        settings["index"],
+        settings["analysis_unit"],
+        settings["date_format"],
+        settings["frequency"],
+    )
+
+    ## Merge into the stored series and find units that actually changed ----
+    series = dict(state["series"])
+    fingerprints = dict(state["fingerprints"])
+    changed = []
+
+    for unit, ts in split_panel(panel).items():
+        if unit in series:
+            ts = ts.combine_first(series[unit])
+
+        fingerprint = series_fingerprint(ts[decompose])
+        if fingerprint != fingerprints.get(unit):
+            series[unit] = ts
+            fingerprints[unit] = fingerprint
+            changed.append(unit)
+
+    ## Pre-flight checks of changed units, repairing copies of the series ----
+    repaired, strategy, report = {}, {}, state.get("report")
+    if changed:
+        repaired, checked = _preflight_units(
+            {unit: series[unit] for unit in changed},
+            decompose,
+            settings["period"],
+            settings["frequency"],
+        )
+        strategy = dict(zip(checked.index, checked["strategy"]))
+        checked = checked.rename_axis(settings["analysis_unit"])
+        if report is not None:
+            checked = pd.concat([report[~report.index.isin(changed)], checked])
+        report = checked
+
+    ## Decompose changed units only, on copies to keep stored series raw ----
+    decompose_unit = partial(
+        _decompose_unit,
+        decompose=decompose,
+        seasonal=settings["seasonal"],
+        period=settings["period"],
+        robust=settings.get("robust", False),
+        inner_iter=settings.get("inner_iter"),
+        outer_iter=settings.get("outer_iter"),
+    )
+    outputs = map_units(
+        decompose_unit,
+        [(unit, ts.copy()) for unit, ts in repaired.items()],
+        n_jobs,
+        executor,
+    )
+
+    results = {unit: result for unit, result in state["results"].items() if unit not in changed}
+    imputed = set(state["imputed"]) - set(changed)
+
+    for unit, (result, lmbda, transform, _) in zip(repaired, outputs):
+        results[unit] = _back_transform(result, lmbda) if transform else result
+        if strategy[unit] == "impute":
+            imputed.add(unit)
+
+    return {
+        "settings": settings,
+        "series": series,
+        "fingerprints": fingerprints,
+        "results": results,
+        "imputed": imputed,
+        "report": report,
+        "updated": changed,
+    }
+
+
+# ==============================================================================
+#                 FUNCTIONS TO SAVE AND LOAD A DECOMPOSITION STATE
+# ==============================================================================
+
+
+def save_decomposition_state(state, path):
+    """Pickle a decomposition state to `path` for the next scheduled update."""
+
+    with open(path, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_decomposition_state(path):
+    """Load a decomposition state saved by `save_decomposition_state()`."""
+
+    with open(path, "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,358 @@
+import hashlib
+import json
+import os
+import time
+from functools import partial
+from pathlib import Path
+
+import pandas as pd
+
+# ==============================================================================
+#                       SETTINGS OF THE COLUMNAR CACHE
+# ==============================================================================
+
+CACHE_DIR = Path(".cache") / "excel"
+
+
+# ==============================================================================
+#                     FUNCTIONS TO BUILD THE CACHE KEYS
+# ==============================================================================
+
+
+def _path_key(path):
+    """Hash of the absolute path of a workbook, shared by all its entries."""
+
+    return hashlib.sha1(str(Path(path).resolve()).encode()).hexdigest()[:16]
+
+
+def _sheet_key(sheet_name):
+    """Hash of a sheet name or position, shared by all entries of the sheet."""
+
+    return hashlib.sha1(repr(sheet_name).encode()).hexdigest()[:8]
+
+
+def _cache_file(path, sheet_name, read_kwargs, cache_dir):
+    """
+    Location of the cached copy of a workbook sheet. The key combines the
+    absolute path, modification time and size of the workbook, the sheet and
+    the remaining `pd.read_excel()` arguments.
+    """
+
+    stat = os.stat(path)
+    key = json.dumps(
+        {
+            "path": str(Path(path).resolve()),
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sheet": sheet_name,
+            "kwargs": read_kwargs,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    return (
+        Path(cache_dir)
+        / f"{_path_key(path)}-{_sheet_key(sheet_name)}-{digest}.parquet"
+    )
+
+
+# ==============================================================================
+#                  FUNCTION TO READ EXCEL WORKBOOKS THROUGH THE CACHE
+# ==============================================================================
+
+
+def read_excel_cached(
+    path, sheet_name=0, use_cache=True, cache_dir=CACHE_DIR, **kwargs
+):
+    """
+    Read a sheet of an Excel workbook, converting it once to Parquet so that
+    later reads of the unchanged workbook skip the Excel parser.
+
+    Parameters
+
+    ----------
+    path: str
+    Location of the workbook.
+
+    sheet_name: str, int, list or None
+    The sheet to read, as in `pd.read_excel()`. A list of sheets, or None for
+    all of them, caches every sheet separately.
+
+    use_cache: bool
+    Whether to read from and write to the cache. When False the workbook is
+    always parsed and the cache is left untouched.
+
+    cache_dir: str
+    Directory holding the Parquet copies. Defaults to ".cache/excel".
+
+    **kwargs: Further arguments passed to `pd.read_excel()`, e.g. `engine`.
+
+    Returns
+    A DataFrame with the content of the sheet, or a dictionary of DataFrames
+    by sheet when `sheet_name` is a list or None.
+    """
+
+    if not use_cache:
+        return pd.read_excel(path, sheet_name=sheet_name, **kwargs)
+
+    ## Several sheets: one cached copy per sheet ----
+    if sheet_name is None or isinstance(sheet_name, list):
+        if sheet_name is None:
+            with pd.ExcelFile(path, engine=kwargs.get("engine")) as workbook:
+                sheet_name = workbook.sheet_names
+        return {
+            sheet: read_excel_cached(
+                path, sheet, use_cache=use_cache, cache_dir=cache_dir, **kwargs
+            )
+            for sheet in sheet_name
+        }
+
+    cache_file = _cache_file(path, sheet_name, kwargs, cache_dir)
+
+    ## Load from the cache when the workbook has not changed ----
+    if cache_file.exists():
+        return pd.read_parquet(cache_file)
+
+    ## Parse the workbook and store its columnar copy ----
+    data = pd.read_excel(path, sheet_name=sheet_name, **kwargs)
+
+    ### Drop stale copies of the same workbook and sheet ----
+    invalidate_excel_cache(path, sheet_name=sheet_name, cache_dir=cache_dir)
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        data.to_parquet(cache_file)
+    except (ValueError, TypeError):
+        ### Columns Parquet cannot represent, e.g. mixed types: skip caching ----
+        cache_file.unlink(missing_ok=True)
+
+    return data
+
+
+# ==============================================================================
+#                     FUNCTION TO INVALIDATE THE CACHE
+# ==============================================================================
+
+
+def invalidate_excel_cache(path=None, sheet_name=None, cache_dir=CACHE_DIR):
+    """
+    Remove cached copies of workbooks.
+
+    Parameters
+
+    ----------
+    path: str
+    The workbook whose copies should be removed. Defaults to None, which
+    clears the whole cache.
+
+    sheet_name: str or int
+    Restrict removal to copies of this sheet of `path`.
+
+    cache_dir: str
+    Directory holding the Parquet copies.
+
+    Returns
+    The number of removed cache files.
+    """
+
+    cache_dir = Path(cache_dir)
+    if not cache_dir.exists():
+        return 0
+
+    if path is None:
+        pattern = "*.parquet"
+    elif sheet_name is None:
+        pattern = f"{_path_key(path)}-*.parquet"
+    else:
+        pattern = f"{_path_key(path)}-{_sheet_key(sheet_name)}-*.parquet"
+
+    removed = 0
+    for cache_file in cache_dir.glob(pattern):
+        cache_file.unlink(missing_ok=True)
+        removed += 1
+
+    return removed
+
+
+# ==============================================================================
+#                  FUNCTIONS TO WRANGLE EVERY SOURCE WORKBOOK
+# ==============================================================================
+
+
+def wrangle_morbidity(raw):
+    """
+    Turn the wide HMIS morbidity sheet into long admissions typed by
+    `apply_schema()`, with short disease labels.
+    """
+
+    from modules.schema import DISEASE_LABELS, apply_schema
+
+    typed, _ = apply_schema(
+        raw.rename(columns={"OPD morbidity": "disease", "Province ": "province"})
+        .melt(id_vars=["disease", "province"], var_name="time", value_name="admission"),
+        labels={"disease": DISEASE_LABELS},
+        date_format="%B %Y",
+        frequency="M",
+    )
+
+    return typed
+
+
+def wrangle_amn(raw):
+    """
+    Turn the acute malnutrition sheet into SAM and MAM admissions, one row per
+    province and year-month.
+    """
+
+    return (
+        raw[["Province", "Year", "Month", "samAdmittedTotal", "mamU5"]]
+        .rename(
+            columns={
+                "samAdmittedTotal": "sam",
+                "mamU5": "mam",
+                "Province": "province",
+            }
+        )
+        .assign(
+            time=lambda x: pd.PeriodIndex.from_fields(
+                year=x["Year"], month=x["Month"], freq="M"
+            )
+        )
+        .drop(columns=["Year", "Month"])
+    )
+
+
+# ==============================================================================
+#                   SOURCE WORKBOOKS AND THEIR EXCEL ENGINES
+# ==============================================================================
+
+## Excel engine of every workbook extension ----
+ENGINES = {".xlsx": "openpyxl", ".xlsm": "openpyxl", ".xls": "xlrd"}
+
+## Source name to its workbook, wrangling and `pd.read_excel()` arguments ----
+SOURCES = {
+    "morbidity": {
+        "path": "data-raw/afg-morbidity-admission-2021-2025.xls",
+        "wrangle": wrangle_morbidity,
+        "sheet_name": 0,
+        "header": 0,
+    },
+    "amn": {
+        "path": "data-raw/afg-amn-monthly-admission-2012-2025.xlsx",
+        "wrangle": wrangle_amn,
+        "sheet_name": "Data",
+        "header": 0,
+    },
+}
+
+## Source settings passed to `AdmissionStore.append()` rather than read ----
+APPEND_SETTINGS = ("time", "keys", "date_format", "frequency")
+
+
+# ==============================================================================
+#                 FUNCTION TO LOAD SEVERAL SOURCES CONCURRENTLY
+# ==============================================================================
+
+
+def _load_source(item, use_cache=True):
+    """Read and wrangle one `(name, spec)` source; runs in a worker."""
+
+    _, spec = item
+    read_kwargs = {
+        k: v for k, v in spec.items() if k not in ("path", "wrangle", *APPEND_SETTINGS)
+    }
+    read_kwargs.setdefault("engine", ENGINES.get(Path(spec["path"]).suffix.lower()))
+
+    start = time.perf_counter()
+    raw = read_excel_cached(spec["path"], use_cache=use_cache, **read_kwargs)
+    read_seconds = time.perf_counter() - start
+
+    wrangle = spec.get("wrangle")
+    data = raw if wrangle is None else wrangle(raw)
+
+    return data, read_seconds, time.perf_counter() - start - read_seconds
+
+
+def load_sources(sources=SOURCES, n_jobs=1, use_cache=True, store=None):
+    """
+    Read and wrangle several source workbooks at once, one worker process
+    per source, so that loading takes about as long as the slowest source.
+
+    Parameters
+
+    ----------
+    sources: dict
+    Source name to a dictionary holding the workbook "path", an optional
+    "wrangle" function of the raw sheet, and further `pd.read_excel()`
+    arguments. The engine defaults to openpyxl for .xlsx and xlrd for .xls.
+    Defaults to `SOURCES`.
+
+    n_jobs: int
+    Number of worker processes; -1 uses one per core up to the number of
+    sources. Defaults to 1, loading sequentially, as worker processes need
+    the calling script to be importable without side effects unless they
+    are forked.
+
+    use_cache: bool
+    Whether sheets are read through the Parquet cache of
+    `read_excel_cached()`.
+
+    store: AdmissionStore
+    A store receiving the wrangled sources. Workbooks it already ingested
+    are skipped without being read; "time", "keys", "date_format" and
+    "frequency" entries of a source are passed to `AdmissionStore.append()`.
+
+    Returns
+    A `(frames, report)` tuple: source name to its wrangled DataFrame, for the
+    sources that were loaded, and a DataFrame of the rows and the read,
+    wrangle and total seconds of every source, with a "total" row holding the
+    wall-clock time of the whole load.
+    """
+
+    from modules.decompose_disease import map_units
+
+    start = time.perf_counter()
+
+    ## Skip workbooks the store already holds ----
+    pending = [
+        (name, spec)
+        for name, spec in sources.items()
+        if store is None or not store.is_ingested(spec["path"], name)
+    ]
+
+    outputs = map_units(partial(_load_source, use_cache=use_cache), pending, n_jobs)
+
+    ## Append to the store one source at a time, as parts share a manifest ----
+    frames, report = {}, {}
+    for (name, spec), (data, read_seconds, wrangle_seconds) in zip(pending, outputs):
+        frames[name] = data
+        if store is not None:
+            settings = {k: spec[k] for k in APPEND_SETTINGS if k in spec}
+            store.record_workbook(spec["path"], name, store.append(data, name, **settings))
+
+        report[name] = {
+            "status": "loaded",
+            "rows": len(data),
+            "read_s": read_seconds,
+            "wrangle_s": wrangle_seconds,
+            "total_s": read_seconds + wrangle_seconds,
+        }
+
+    for name in sources:
+        report.setdefault(
+            name,
+            {"status": "skipped", "rows": 0, "read_s": 0.0, "wrangle_s": 0.0, "total_s": 0.0},
+        )
+
+    report = pd.DataFrame.from_dict(report, orient="index").loc[list(sources)]
+    report.loc["total"] = [
+        "",
+        report["rows"].sum(),
+        report["read_s"].sum(),
+        report["wrangle_s"].sum(),
+        time.perf_counter() - start,
+    ]
+
+    return frames, report
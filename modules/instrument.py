@@ -0,0 +1,171 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# ==============================================================================
+#                      RECORDER OF STAGE TIMINGS AND MEMORY
+# ==============================================================================
+
+## The recorder of the running `instrument()` block, None when disabled ----
+_ACTIVE = None
+
+## Shared no-op context returned by `stage()` when instrumentation is off ----
+_DISABLED = nullcontext()
+
+
+class StageRecorder:
+    """
+    Collects wall time, call counts and (optionally) peak memory of the
+    pipeline stages entered through `stage()`.
+
+    Attributes
+    ----------
+    stages: dict
+        Totals per stage name: "calls", "seconds" and "peak_bytes".
+
+    units: dict
+        The same totals per `(stage, unit)` pair, for stages run on behalf of
+        an analysis unit.
+    """
+
+    def __init__(self, track_memory=False, callback=None, log=None):
+        self.track_memory = track_memory
+        self.callback = callback
+        self.log = log
+        self.stages = {}
+        self.units = {}
+        self._stack = []
+
+    @contextmanager
+    def _stage(self, name, unit=None):
+        ### Stages nested in a unit's stage are attributed to that unit ----
+        if unit is None and self._stack:
+            unit = self._stack[-1]["unit"]
+
+        frame = {"unit": unit, "child_peak": 0, "start_memory": 0}
+        if self.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                parent = self._stack[-1]
+                parent["child_peak"] = max(parent["child_peak"], peak)
+            frame["start_memory"] = current
+            tracemalloc.reset_peak()
+
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+
+            peak_bytes = None
+            if self.track_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], frame["child_peak"])
+                peak_bytes = peak - frame["start_memory"]
+                if self._stack:
+                    parent = self._stack[-1]
+                    parent["child_peak"] = max(parent["child_peak"], peak)
+
+            self._record(name, unit, seconds, peak_bytes)
+
+    def _record(self, name, unit, seconds, peak_bytes):
+        event = {
+            "stage": name,
+            "unit": None if unit is None else str(unit),
+            "seconds": seconds,
+            "peak_bytes": peak_bytes,
+        }
+
+        targets = [(self.stages, name)]
+        if unit is not None:
+            targets.append((self.units, (name, event["unit"])))
+
+        for totals, key in targets:
+            entry = totals.setdefault(
+                key, {"calls": 0, "seconds": 0.0, "peak_bytes": None}
+            )
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            if peak_bytes is not None:
+                entry["peak_bytes"] = max(entry["peak_bytes"] or 0, peak_bytes)
+
+        if self.log is not None:
+            self.log.write(json.dumps(event) + "\n")
+        if self.callback is not None:
+            self.callback(event)
+
+    def summary(self):
+        """Per-stage and per-unit totals as plain dictionaries."""
+
+        return {
+            "stages": self.stages,
+            "units": [
+                {"stage": name, "unit": unit, **totals}
+                for (name, unit), totals in self.units.items()
+            ],
+        }
+
+
+# ==============================================================================
+#                  FUNCTIONS TO ENABLE AND MARK INSTRUMENTED STAGES
+# ==============================================================================
+
+
+@contextmanager
+def instrument(track_memory=False, callback=None, log_path=None):
+    """
+    Record the stages of the pipeline run inside the `with` block.
+
+    Parameters
+    ----------
+    track_memory: bool
+        Whether to record peak memory per stage with tracemalloc. This slows
+        the run down noticeably, so it is off by default.
+
+    callback: callable
+        Called with an event dictionary ("stage", "unit", "seconds",
+        "peak_bytes") every time a stage finishes.
+
+    log_path: str
+        A file to append the events to as JSON lines.
+
+    Yields
+    The `StageRecorder` collecting the totals.
+
+    Notes
+    Stages run in worker processes (`n_jobs` > 1) are not recorded; only the
+    time spent waiting for the pool in the parent is.
+    """
+
+    global _ACTIVE
+
+    log = open(log_path, "a") if log_path is not None else None
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    previous = _ACTIVE
+    _ACTIVE = StageRecorder(track_memory, callback, log)
+    try:
+        yield _ACTIVE
+    finally:
+        _ACTIVE = previous
+        if started_tracing:
+            tracemalloc.stop()
+        if log is not None:
+            log.close()
+
+
+def stage(name, unit=None):
+    """
+    Mark a stage of the pipeline. A shared no-op context is returned when no
+    `instrument()` block is running, so disabled instrumentation costs one
+    global lookup.
+    """
+
+    if _ACTIVE is None:
+        return _DISABLED
+
+    return _ACTIVE._stage(name, unit)
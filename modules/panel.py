@@ -0,0 +1,371 @@
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+#            COMPACT ARRAY-BACKED CONTAINER OF DECOMPOSITION RESULTS
+# ==============================================================================
+
+
+class DecompositionPanel:
+    """
+    Decomposition components of many analysis units stored as one contiguous
+    (unit, time, component) array over a shared time index.
+
+    Parameters
+    ----------
+    values: ndarray
+        A 3-D array of shape (units, times, components). Periods a unit does
+        not cover are NaN.
+
+    units: Index
+        Labels of the analysis units, in the order of the first axis.
+
+    times: Index
+        The shared time index, in the order of the second axis.
+
+    components: tuple of str
+        Names of the components, in the order of the third axis.
+
+    lmbda: array_like
+        Box-Cox lambda estimated for each unit, NaN when unknown.
+
+    transformed: array_like
+        Whether each unit was decomposed on the Box-Cox scale and
+        back-transformed.
+
+    imputed: array_like
+        Whether each unit's series was ffill-imputed before decomposition.
+
+    iterations: array_like
+        Outer (robustness) iterations run by each unit's fit, -1 when unknown.
+
+    model: ndarray
+        Components of the transformed units on the Box-Cox scale they were
+        decomposed on, of shape (transformed units, times, components) in the
+        order of the first axis. None when not known.
+    """
+
+    __slots__ = (
+        "values",
+        "units",
+        "times",
+        "components",
+        "lmbda",
+        "transformed",
+        "imputed",
+        "iterations",
+        "model",
+    )
+
+    def __init__(
+        self,
+        values,
+        units,
+        times,
+        components=("observed", "trend", "seasonal", "resid"),
+        lmbda=None,
+        transformed=None,
+        imputed=None,
+        iterations=None,
+        model=None,
+    ):
+        n_units = len(units)
+
+        self.values = np.ascontiguousarray(values)
+        self.units = pd.Index(units, tupleize_cols=False)
+        self.times = pd.Index(times)
+        self.components = tuple(components)
+        self.lmbda = (
+            np.full(n_units, np.nan) if lmbda is None else np.asarray(lmbda, dtype="float64")
+        )
+        self.transformed = (
+            np.zeros(n_units, dtype=bool) if transformed is None else np.asarray(transformed, dtype=bool)
+        )
+        self.imputed = (
+            np.zeros(n_units, dtype=bool) if imputed is None else np.asarray(imputed, dtype=bool)
+        )
+        self.iterations = (
+            np.full(n_units, -1) if iterations is None else np.asarray(iterations, dtype="int64")
+        )
+
+        self.model = None if model is None else np.ascontiguousarray(model)
+
+        if self.values.shape != (n_units, len(self.times), len(self.components)):
+            raise ValueError("values must have shape (units, times, components).")
+        if self.model is not None and self.model.shape != (
+            self.transformed.sum(),
+            *self.values.shape[1:],
+        ):
+            raise ValueError("model must have shape (transformed units, times, components).")
+
+    ## ---- Construction -------------------------------------------------------
+
+    @classmethod
+    def from_results(
+        cls,
+        results,
+        lmbda=None,
+        transformed=None,
+        imputed=None,
+        dtype="float64",
+        components=None,
+        iterations=None,
+        model=None,
+    ):
+        """
+        Build a panel from a dictionary returned by `apply_stl_decomposition()`.
+
+        Parameters
+        ----------
+        results: dict
+            Analysis unit to `DecomposeResult` or back-transformed DataFrame.
+
+        lmbda, transformed, imputed, iterations: dict
+            Per-unit Box-Cox lambda, transform flag, imputation flag and outer
+            iterations run. When `transformed` is not given, back-transformed
+            DataFrames are taken as transformed.
+
+        dtype: str
+            "float64" (default) or "float32" to halve memory.
+
+        components: tuple of str
+            Components to store. Defaults to the four usual ones, followed by
+            the "seasonal_<period>" components of multi-seasonal results
+            when every unit has them.
+
+        model: dict
+            Transformed analysis unit to its decomposition on the Box-Cox
+            scale, before the back-transform.
+        """
+
+        from modules.decompose_disease import COMPONENTS, pull_all_components
+
+        ### Per-period seasonalities present in every result ----
+        if components is None:
+            columns = [list(getattr(result, "columns", [])) for result in results.values()]
+            components = COMPONENTS + tuple(
+                c
+                for c in (columns[0] if columns else [])
+                if c.startswith("seasonal_") and all(c in other for other in columns)
+            )
+
+        values, units, times = pull_all_components(
+            results, components=components, as_array=True
+        )
+
+        if transformed is None:
+            transformed = {
+                unit: isinstance(result, pd.DataFrame) for unit, result in results.items()
+            }
+
+        def per_unit(mapping, default):
+            mapping = mapping or {}
+            return [mapping.get(unit, default) for unit in results]
+
+        ### Box-Cox-scale components of the transformed units ----
+        flags = per_unit(transformed, False)
+        if model is not None:
+            fitted = {unit: model[unit] for unit, flag in zip(results, flags) if flag}
+            model = np.full((len(fitted), len(times), len(components)), np.nan)
+            if fitted:
+                model_values, _, model_times = pull_all_components(
+                    fitted, components=components, as_array=True
+                )
+                model[:, times.get_indexer(model_times)] = model_values
+
+        return cls(
+            values.astype(dtype, copy=False),
+            units,
+            times,
+            components,
+            lmbda=per_unit(lmbda, np.nan),
+            transformed=flags,
+            imputed=per_unit(imputed, False),
+            iterations=per_unit(iterations, -1),
+            model=None if model is None else model.astype(dtype, copy=False),
+        )
+
+    ## ---- Access -------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.units)
+
+    def __contains__(self, unit):
+        return unit in self.units
+
+    def __iter__(self):
+        return iter(self.units)
+
+    def __repr__(self):
+        return (
+            f"DecompositionPanel({len(self.units)} units x {len(self.times)} periods, "
+            f"{', '.join(self.components)}, dtype={self.values.dtype})"
+        )
+
+    @property
+    def nbytes(self):
+        """Memory held by the component arrays."""
+
+        return self.values.nbytes + (0 if self.model is None else self.model.nbytes)
+
+    def __getitem__(self, unit):
+        """
+        Components of one unit as a DataFrame indexed by time, backed by a view
+        of the panel's array. Periods the unit does not cover are dropped.
+        """
+
+        u = self.units.get_loc(unit)
+        frame = pd.DataFrame(
+            self.values[u], index=self.times, columns=list(self.components), copy=False
+        )
+
+        return frame.dropna(how="all")
+
+    def component(self, name):
+        """One component of every unit as a (time x unit) DataFrame view."""
+
+        c = self.components.index(name)
+
+        return pd.DataFrame(
+            self.values[:, :, c].T, index=self.times, columns=self.units, copy=False
+        )
+
+    def model_scale(self, name):
+        """
+        One component of every unit as a (unit x time) array on the scale it
+        was decomposed on: the Box-Cox scale for transformed units, whose
+        stored components are back-transformed, and the original scale
+        otherwise. See `require_lambdas()`.
+        """
+
+        self.require_lambdas()
+        c = self.components.index(name)
+
+        values = self.values[:, :, c].astype("float64")
+        if self.transformed.any():
+            values[self.transformed] = self.model[:, :, c]
+
+        return values
+
+    def require_lambdas(self):
+        """
+        Raise unless the Box-Cox lambda and the Box-Cox-scale components of
+        every back-transformed unit are known.
+
+        Panels returned by `apply_stl_decomposition(output="panel")` carry
+        both. Panels built from a dictionary of results know neither, so
+        forecasts, bootstrap bands and risk scores of back-transformed units
+        need such a panel.
+        """
+
+        missing = self.transformed & (np.isnan(self.lmbda) | (self.model is None))
+        if missing.any():
+            raise ValueError(
+                "Box-Cox lambda or scale unknown for back-transformed units "
+                f"{list(self.units[missing])}; use apply_stl_decomposition(output='panel')."
+            )
+
+    def sel(self, units=None, start=None, end=None):
+        """
+        Slice the panel by units and/or a time range. Time slices are views
+        of the array; selecting units copies only the selected rows.
+        """
+
+        u = slice(None) if units is None else self.units.get_indexer(units)
+        if units is not None and (u < 0).any():
+            raise KeyError("Unknown units in selection.")
+        t = self.times.slice_indexer(start, end)
+
+        ### Rows of the selected units among the transformed ones ----
+        model = None
+        if self.model is not None:
+            rows = (np.cumsum(self.transformed) - 1)[u][self.transformed[u]]
+            model = self.model[rows, t]
+
+        return DecompositionPanel(
+            self.values[u, t],
+            self.units[u],
+            self.times[t],
+            self.components,
+            lmbda=self.lmbda[u],
+            transformed=self.transformed[u],
+            imputed=self.imputed[u],
+            iterations=self.iterations[u],
+            model=model,
+        )
+
+    def astype(self, dtype):
+        """A copy of the panel with components stored as `dtype`."""
+
+        return DecompositionPanel(
+            self.values.astype(dtype),
+            self.units,
+            self.times,
+            self.components,
+            lmbda=self.lmbda,
+            transformed=self.transformed,
+            imputed=self.imputed,
+            iterations=self.iterations,
+            model=None if self.model is None else self.model.astype(dtype),
+        )
+
+    ## ---- Conversion ---------------------------------------------------------
+
+    def to_frame(self, unit_name="province"):
+        """Tidy long DataFrame with a categorical analysis-unit column."""
+
+        n_units, n_times, _ = self.values.shape
+        covered = ~np.isnan(self.values).all(axis=2).ravel()
+
+        tidy = pd.DataFrame(
+            self.values.reshape(n_units * n_times, -1)[covered],
+            index=np.tile(self.times, n_units)[covered],
+            columns=list(self.components),
+        )
+        tidy.index.name = self.times.name
+        tidy.insert(
+            0,
+            unit_name,
+            pd.Categorical.from_codes(
+                np.repeat(np.arange(n_units), n_times)[covered], categories=self.units
+            ),
+        )
+
+        return tidy
+
+    def unit_columns(self, unit_name, positions):
+        """
+        Analysis-unit columns of a tidy table whose rows belong to the units
+        at `positions`: one column named `unit_name`, or one column per name
+        in a list `unit_name`, splitting tuple units into their levels.
+        """
+
+        if isinstance(unit_name, str):
+            return pd.DataFrame({unit_name: self.units[positions]})
+
+        labels = pd.MultiIndex.from_tuples(list(self.units), names=unit_name)
+
+        return pd.DataFrame(
+            {
+                name: labels.get_level_values(level)[positions]
+                for level, name in enumerate(unit_name)
+            }
+        )
+
+    def to_dict(self):
+        """Analysis unit to components DataFrame, like the "multiple" scope."""
+
+        return {unit: self[unit] for unit in self.units}
+
+    def unit_info(self):
+        """Per-unit Box-Cox lambda, transform and imputation flags, iterations."""
+
+        return pd.DataFrame(
+            {
+                "lmbda": self.lmbda,
+                "transformed": self.transformed,
+                "imputed": self.imputed,
+                "iterations": self.iterations,
+            },
+            index=self.units,
+        )
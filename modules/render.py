@@ -0,0 +1,173 @@
+import os
+import re
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from modules.decompose_disease import (
+    create_time_plot,
+    map_units,
+    plot_seasonal_subseries,
+)
+
+# ==============================================================================
+#                 REUSABLE HEADLESS FIGURE OF A RENDERING PROCESS
+# ==============================================================================
+
+## One figure per process, cleared and redrawn for every chart ----
+_FIGURE = None
+
+
+def _axes(figsize=(12, 6.5)):
+    """The process' reusable Agg figure, with its axes cleared."""
+
+    global _FIGURE
+
+    ### A bare Figure renders with Agg and leaves pyplot's state untouched ----
+    if _FIGURE is None:
+        from matplotlib.figure import Figure
+
+        _FIGURE = Figure(figsize=figsize)
+        _FIGURE.subplots()
+
+    _FIGURE.set_size_inches(figsize)
+    ax = _FIGURE.axes[0]
+    ax.clear()
+
+    return ax
+
+
+def _draw(name, data, kind, **kwargs):
+    """Draw one chart on the reusable axes and return its figure."""
+
+    ax = _axes()
+
+    if kind == "time":
+        index = data.index
+        kwargs.setdefault("start", f"{index[0]:%b %Y}")
+        kwargs.setdefault("end", f"{index[-1]:%b %Y}")
+        kwargs.setdefault("disease", name)
+        create_time_plot(data, ax=ax, **kwargs)
+    elif kind == "subseries":
+        kwargs.setdefault("disease_name", name)
+        plot_seasonal_subseries(data, ax=ax, **kwargs)
+    else:
+        raise ValueError("kind must be 'time' or 'subseries'")
+
+    return ax.figure
+
+
+def _file_name(name):
+    """A file-system safe stem for a chart name, e.g. a (province, disease)."""
+
+    if isinstance(name, tuple):
+        name = "-".join(str(part) for part in name)
+
+    return re.sub(r"[^\w.-]+", "_", str(name)).strip("_")
+
+
+def _render_chunk(chunk, kind, output_dir, fmt, dpi, kwargs):
+    """Render a chunk of `(name, data)` items to files; runs in a worker."""
+
+    paths = []
+    for name, data in chunk:
+        figure = _draw(name, data, kind, **kwargs)
+        path = Path(output_dir) / f"{_file_name(name)}.{fmt}"
+        figure.savefig(path, format=fmt, dpi=dpi, bbox_inches="tight")
+        paths.append(str(path))
+
+    return paths
+
+
+# ==============================================================================
+#                    FUNCTION TO RENDER MANY CHARTS IN BATCH
+# ==============================================================================
+
+
+def render_batch(
+    items,
+    kind="subseries",
+    output_dir=None,
+    pdf_path=None,
+    fmt="png",
+    dpi=100,
+    n_jobs=1,
+    **kwargs,
+):
+    """
+    Render time plots or seasonal subseries of many series headlessly.
+
+    Parameters
+    ----------
+    items: dict
+        Chart name (e.g. province, or a (province, disease) pair) to the
+        data to plot: a time series from `summarise_disease()` for
+        kind="time", or a decomposition for kind="subseries", such as the
+        dictionary returned by `apply_stl_decomposition(scope="multiple")`.
+
+    kind: str
+        "time" for `create_time_plot()` or "subseries" for
+        `plot_seasonal_subseries()`.
+
+    output_dir: str
+        Directory receiving one file per chart, named after the chart.
+
+    pdf_path: str
+        A multi-page PDF receiving one page per chart, instead of separate
+        files. Pages are rendered in this process, in the order of `items`.
+
+    fmt: str
+        Format of the separate files: "png" (default) or "pdf".
+
+    dpi: int
+        Resolution of raster output.
+
+    n_jobs: int
+        Number of worker processes rendering separate files. Each worker
+        reuses a single figure for all its charts.
+
+    **kwargs: Further arguments of the plotting function, e.g. `time="M"`.
+
+    Returns
+    The list of written file paths.
+    """
+
+    items = list(items.items())
+
+    ## ---- One multi-page PDF ----------------------------------------------------
+
+    if pdf_path is not None:
+        from matplotlib.backends.backend_pdf import PdfPages
+
+        Path(pdf_path).parent.mkdir(parents=True, exist_ok=True)
+        with PdfPages(pdf_path) as pdf:
+            for name, data in items:
+                pdf.savefig(_draw(name, data, kind, **kwargs), bbox_inches="tight")
+
+        return [str(pdf_path)]
+
+    ## ---- One file per chart, across worker processes ---------------------------
+
+    if output_dir is None:
+        raise ValueError("Either output_dir or pdf_path must be provided.")
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    workers = os.cpu_count() if n_jobs in (None, -1) else n_jobs
+    n_chunks = max(1, min(len(items), workers))
+    chunks = [
+        [items[i] for i in chunk]
+        for chunk in np.array_split(np.arange(len(items)), n_chunks)
+        if len(chunk)
+    ]
+    render_chunk = partial(
+        _render_chunk,
+        kind=kind,
+        output_dir=output_dir,
+        fmt=fmt,
+        dpi=dpi,
+        kwargs=kwargs,
+    )
+
+    return [path for paths in map_units(render_chunk, chunks, n_jobs) for path in paths]
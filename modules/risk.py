@@ -0,0 +1,227 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from modules.instrument import stage
+from modules.panel import DecompositionPanel
+
+# ==============================================================================
+#                          SETTINGS OF RISK SCORING
+# ==============================================================================
+
+## Scale turning a median absolute deviation into a standard deviation ----
+MAD_SCALE = 1.4826
+
+
+# ==============================================================================
+#            FUNCTIONS TO SCORE A (UNIT x TIME) MATRIX OF COMPONENTS
+# ==============================================================================
+
+
+def _windows(values, window, current):
+    """
+    A (units, times, window) view of the `window` periods ending at every
+    period, or preceding it when `current` is False. Periods before the start
+    of the series are NaN.
+    """
+
+    lag = 0 if current else 1
+    padded = np.concatenate(
+        [np.full((values.shape[0], window - 1 + lag), np.nan), values[:, : values.shape[1] - lag]],
+        axis=1,
+    )
+
+    return sliding_window_view(padded, window, axis=1)
+
+
+def robust_zscores(values, window=12, min_periods=None):
+    """
+    Rolling robust z-scores of every unit and period.
+
+    Each value is compared with the median of the `window` preceding periods
+    of its unit and scaled by their median absolute deviation, so that an
+    outbreak does not inflate its own baseline.
+
+    Parameters
+    ----------
+    values: ndarray
+        A (units, times) array, e.g. residuals, NaN where a unit has no data.
+
+    window: int
+        Number of preceding periods forming the baseline.
+
+    min_periods: int
+        Minimum number of observed periods in the baseline. Defaults to half
+        of `window`.
+
+    Returns
+    A (units, times) array of z-scores, NaN where the baseline is too short
+    or has no spread.
+    """
+
+    values = np.asarray(values, dtype="float64")
+    min_periods = window // 2 if min_periods is None else min_periods
+    baseline = _windows(values, window, current=False)
+
+    with warnings.catch_warnings():
+        ### All-NaN baselines at the start of series are expected ----
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(baseline, axis=2)
+        mad = MAD_SCALE * np.nanmedian(np.abs(baseline - median[..., None]), axis=2)
+
+    enough = (~np.isnan(baseline)).sum(axis=2) >= min_periods
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (values - median) / mad
+
+    return np.where(enough & (mad > 0), z, np.nan)
+
+
+def trend_slopes(values, window=6):
+    """
+    Least-squares slope of every unit's trend over the `window` periods ending
+    at each period.
+
+    Parameters
+    ----------
+    values: ndarray
+        A (units, times) array of trend components.
+
+    window: int
+        Number of periods the slope is fitted over.
+
+    Returns
+    A `(slope, relative)` tuple of (units, times) arrays: the change per
+    period, and that change as a percentage of the mean level of the window.
+    NaN where the window is incomplete.
+    """
+
+    values = np.asarray(values, dtype="float64")
+    windows = _windows(values, window, current=True)
+
+    x = np.arange(window) - (window - 1) / 2
+    slope = windows @ (x / (x**2).sum())
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative = 100 * slope / np.abs(windows.mean(axis=2))
+
+    return slope, relative
+
+
+def exceedance_runs(exceed):
+    """
+    Number of consecutive exceedances ending at every period of a
+    (units, times) boolean array, 0 where the period does not exceed.
+    """
+
+    exceed = np.asarray(exceed, dtype=bool)
+    count = np.cumsum(exceed, axis=1)
+    last_reset = np.maximum.accumulate(np.where(exceed, 0, count), axis=1)
+
+    return count - last_reset
+
+
+# ==============================================================================
+#                    FUNCTION TO RANK RISK ACROSS THE PANEL
+# ==============================================================================
+
+
+def score_risk(
+    results,
+    window=12,
+    slope_window=6,
+    threshold=2.0,
+    periods=1,
+    min_periods=None,
+    unit_name="unit",
+):
+    """
+    Score every analysis unit from its decomposition and rank the alerts.
+
+    Residuals are scored on the scale each unit was decomposed on, as the
+    stored residuals of Box-Cox units are back-transformed factors. Trends
+    are compared on the original scale.
+
+    Parameters
+    ----------
+    results: DecompositionPanel or dict
+        Decompositions of many units, as returned by
+        `apply_stl_decomposition(scope="multiple")` with output "panel" or
+        "dict"; see `DecompositionPanel.require_lambdas()` for back-transformed
+        units.
+
+    window: int
+        Number of preceding periods forming the baseline of the robust
+        z-scores of the residuals.
+
+    slope_window: int
+        Number of periods the trend slope is fitted over.
+
+    threshold: float
+        Robust z-score above which a residual is an exceedance.
+
+    periods: int
+        Number of most recent periods of the shared time index to report.
+
+    min_periods: int
+        Minimum number of observed baseline periods, see `robust_zscores()`.
+
+    unit_name: str or list of str
+        Name of the unit column, or one name per level of tuple units, e.g.
+        ["province", "disease"].
+
+    Returns
+    A DataFrame with one row per unit and reported period, holding the
+    observed and trend values, the residual on the model scale, the robust
+    z-score, the trend slope (per period and in percent), the exceedance
+    flag and the number of consecutive exceedances. Rows are ranked by
+    z-score, highest first, and units without a score in these periods are
+    left out.
+    """
+
+    panel = (
+        results
+        if isinstance(results, DecompositionPanel)
+        else DecompositionPanel.from_results(results)
+    )
+
+    def component(name):
+        return panel.values[:, :, panel.components.index(name)].astype("float64")
+
+    with stage("risk"):
+        resid = panel.model_scale("resid")
+        trend = component("trend")
+
+        z = robust_zscores(resid, window, min_periods)
+        slope, relative = trend_slopes(trend, slope_window)
+        exceed = z > threshold
+        run = exceedance_runs(exceed)
+
+        ## Most recent periods of every unit, ranked by z-score ----
+        recent = slice(max(len(panel.times) - periods, 0), None)
+        n_units, n_times = z[:, recent].shape
+
+        table = pd.DataFrame(
+            {
+                "time": np.tile(panel.times[recent], n_units),
+                "observed": component("observed")[:, recent].ravel(),
+                "trend": trend[:, recent].ravel(),
+                "resid": resid[:, recent].ravel(),
+                "zscore": z[:, recent].ravel(),
+                "slope": slope[:, recent].ravel(),
+                "slope_pct": relative[:, recent].ravel(),
+                "exceed": exceed[:, recent].ravel(),
+                "run": run[:, recent].ravel(),
+            }
+        )
+
+        units = np.repeat(np.arange(n_units), n_times)
+        table = panel.unit_columns(unit_name, units).join(table)
+
+        table = table.dropna(subset=["zscore"]).sort_values(
+            ["zscore", "slope_pct"], ascending=False, kind="stable", ignore_index=True
+        )
+        table.insert(0, "rank", np.arange(1, len(table) + 1))
+
+    return table
@@ -0,0 +1,239 @@
+import numpy as np
+import pandas as pd
+
+from modules.decompose_disease import decode_periods, encode_periods
+from modules.instrument import stage
+
+# ==============================================================================
+#                    SCHEMA OF THE LONG ADMISSIONS TABLES
+# ==============================================================================
+
+## Kind of every variable of the melted admissions ----
+ADMISSIONS_SCHEMA = {
+    "disease": "category",
+    "province": "category",
+    "time": "period",
+    "admission": "count",
+}
+
+## Short names of the HMIS morbidity labels ----
+DISEASE_LABELS = {
+    "HMIS-MIAR-OPD- New Acute Watery Diarrhea": "AWD",
+    "HMIS-MIAR-OPD- New Cough and Cold (ARI)": "ARI",
+    "HMIS-MIAR-OPD- New Measles": "Measles",
+    "HMIS-MIAR-OPD- New Malaria": "Malaria",
+    "HMIS-MIAR-OPD- New Pneumonia (ARI)": "New Pneumonia",
+}
+
+## Nullable integer types, narrowest first ----
+UNSIGNED_TYPES = ("UInt8", "UInt16", "UInt32", "UInt64")
+SIGNED_TYPES = ("Int8", "Int16", "Int32", "Int64")
+
+
+# ==============================================================================
+#                  FUNCTIONS TO CONVERT VARIABLES TO THEIR KIND
+# ==============================================================================
+
+
+def narrowest_integer(values):
+    """
+    The narrowest nullable integer type holding every value of `values`, or
+    None when some non-missing value is not a whole number.
+    """
+
+    values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(
+        dtype="float64", na_value=np.nan
+    )
+    observed = values[~np.isnan(values)]
+
+    if not np.all(observed == np.round(observed)):
+        return None
+    if not observed.size:
+        return UNSIGNED_TYPES[0]
+
+    low, high = observed.min(), observed.max()
+    for dtype in UNSIGNED_TYPES if low >= 0 else SIGNED_TYPES:
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            return dtype
+
+    return None
+
+
+def _to_category(column, labels=None):
+    """A categorical column, with categories renamed by `labels`."""
+
+    column = column.astype("category")
+    if not labels:
+        return column
+
+    ### Rename categories once, merging those sharing a new name ----
+    categories = column.cat.categories
+    renamed = pd.Index([labels.get(c, c) for c in categories])
+    if renamed.is_unique:
+        return column.cat.rename_categories(dict(zip(categories, renamed)))
+
+    merged = renamed.unique()
+    codes = column.cat.codes.to_numpy()
+    codes = np.where(codes < 0, -1, merged.get_indexer(renamed)[codes])
+
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=merged),
+        index=column.index,
+        name=column.name,
+    )
+
+
+def _to_period(column, date_format, frequency):
+    """A Period column backed by the int64 period codes of its labels."""
+
+    codes = encode_periods(column, date_format, frequency)
+
+    return pd.Series(
+        decode_periods(codes, frequency), index=column.index, name=column.name
+    )
+
+
+def _to_count(column):
+    """A count column in the narrowest nullable integer type that fits."""
+
+    dtype = narrowest_integer(column)
+    if dtype is None:
+        return column
+
+    values = pd.to_numeric(column, errors="coerce").to_numpy(
+        dtype="float64", na_value=np.nan
+    )
+    return pd.Series(pd.array(values, dtype=dtype), index=column.index, name=column.name)
+
+
+# ==============================================================================
+#                    FUNCTION TO APPLY THE ADMISSIONS SCHEMA
+# ==============================================================================
+
+
+def apply_schema(
+    data,
+    schema=ADMISSIONS_SCHEMA,
+    labels=None,
+    date_format="%B %Y",
+    frequency="M",
+    validate=True,
+):
+    """
+    Convert admissions data to compact dtypes: categoricals for labels,
+    periods for time and the narrowest nullable integer type for counts.
+
+    Parameters
+
+    ----------
+    data : Long admissions data, e.g. the melted morbidity table.
+
+    schema: dict
+    Variable name to its kind: "category", "period" or "count". Defaults to
+    `ADMISSIONS_SCHEMA`.
+
+    labels: dict
+    Variable name to a mapping of old to new labels, applied as a rename of
+    the categories, e.g. {"disease": DISEASE_LABELS}. Labels mapped to the
+    same new name are merged.
+
+    date_format: str
+    The date format of time labels.
+
+    frequency: str
+    Period frequency of the time variable. Defaults to "M" for month.
+
+    validate: bool
+    Whether to check the converted data with `validate_schema()`.
+
+    Returns
+    A `(typed, report)` tuple: a copy of `data` with converted variables, and
+    a DataFrame of the dtype and memory of every variable before and after.
+    """
+
+    labels = labels or {}
+    missing = [column for column in schema if column not in data]
+    if missing:
+        raise ValueError(f"Variables missing from the data: {missing}")
+
+    with stage("schema"):
+        before = data.memory_usage(index=False, deep=True)
+        typed = data.copy()
+
+        for column, kind in schema.items():
+            if kind == "category":
+                typed[column] = _to_category(typed[column], labels.get(column))
+            elif kind == "period":
+                typed[column] = _to_period(typed[column], date_format, frequency)
+            elif kind == "count":
+                typed[column] = _to_count(typed[column])
+            else:
+                raise ValueError("kind must be 'category', 'period' or 'count'")
+
+        after = typed.memory_usage(index=False, deep=True)
+
+    if validate:
+        validate_schema(typed, schema, frequency)
+
+    report = pd.DataFrame(
+        {
+            "dtype_before": data.dtypes.astype(str),
+            "dtype_after": typed.dtypes.astype(str),
+            "bytes_before": before,
+            "bytes_after": after,
+        }
+    )
+    report.loc["total"] = ["", "", before.sum(), after.sum()]
+
+    return typed, report
+
+
+# ==============================================================================
+#                     FUNCTION TO VALIDATE THE SCHEMA
+# ==============================================================================
+
+
+def validate_schema(data, schema=ADMISSIONS_SCHEMA, frequency="M"):
+    """
+    Check that admissions data follows a schema.
+
+    Parameters
+
+    ----------
+    data : Admissions data returned by `apply_schema()`.
+
+    schema: dict
+    Variable name to its kind, see `apply_schema()`.
+
+    frequency: str
+    The expected period frequency of "period" variables.
+
+    Returns
+    None. A ValueError listing every violation is raised otherwise.
+    """
+
+    problems = []
+
+    for column, kind in schema.items():
+        if column not in data:
+            problems.append(f"{column}: missing")
+            continue
+
+        dtype = data[column].dtype
+        if kind == "category":
+            if not isinstance(dtype, pd.CategoricalDtype):
+                problems.append(f"{column}: expected category, found {dtype}")
+        elif kind == "period":
+            if not isinstance(dtype, pd.PeriodDtype):
+                problems.append(f"{column}: expected period, found {dtype}")
+            elif dtype != pd.PeriodDtype(frequency):
+                problems.append(f"{column}: expected period[{frequency}], found {dtype}")
+        elif kind == "count":
+            if not pd.api.types.is_integer_dtype(dtype):
+                problems.append(f"{column}: expected whole counts, found {dtype}")
+            elif (data[column] < 0).any():
+                problems.append(f"{column}: negative counts")
+
+    if problems:
+        raise ValueError("Data does not follow the schema:\n  " + "\n  ".join(problems))
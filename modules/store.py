@@ -0,0 +1,374 @@
+import base64
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from modules.decompose_disease import NAT_CODE, decode_periods, encode_periods
+from modules.instrument import stage
+
+# ==============================================================================
+#                     SETTINGS OF THE PARTITIONED STORE
+# ==============================================================================
+
+STORE_DIR = Path("data") / "admissions-store"
+
+## Variables identifying a row, in the order they are looked for ----
+KEY_CANDIDATES = ("province", "disease", "time")
+
+## Partition variable added to every stored row ----
+YEAR_FIELD = pa.field("year", pa.int32())
+
+
+# ==============================================================================
+#                 FUNCTIONS TO KEEP ONE SCHEMA ACROSS PART FILES
+# ==============================================================================
+
+
+def _storage_table(part, schema=None):
+    """
+    Arrow table of a part, with every integer variable stored as Int64 and
+    every categorical with int32 codes, so that exports whose counts fit
+    narrower types share one schema. Given the `schema` of the source, the
+    table is cast to it.
+    """
+
+    widened = {
+        name: "Int64"
+        for name, dtype in part.dtypes.items()
+        if pd.api.types.is_integer_dtype(dtype)
+    }
+    table = pa.Table.from_pandas(part.astype(widened), preserve_index=False)
+
+    if schema is None:
+        return table.cast(
+            pa.schema(
+                [
+                    field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+                    if pa.types.is_dictionary(field.type)
+                    else field
+                    for field in table.schema
+                ],
+                metadata=table.schema.metadata,
+            )
+        )
+
+    if sorted(table.schema.names) != sorted(schema.names):
+        raise ValueError(
+            f"Variables {table.schema.names} do not match the stored {schema.names}."
+        )
+    return table.select(schema.names).cast(schema)
+
+
+def _encode_schema(schema):
+    """Arrow schema as text, to be kept in the manifest."""
+
+    return base64.b64encode(schema.serialize().to_pybytes()).decode("ascii")
+
+
+def _decode_schema(text):
+    """Arrow schema kept in the manifest by `_encode_schema()`."""
+
+    return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(text)))
+
+
+# ==============================================================================
+#              APPEND-ONLY ADMISSIONS DATASET PARTITIONED BY SOURCE AND YEAR
+# ==============================================================================
+
+
+class AdmissionStore:
+    """
+    Admissions of several sources kept as one Parquet dataset, partitioned
+    as `source=<name>/year=<yyyy>/part-<n>.parquet`. Exports are appended as
+    new part files, existing files are never rewritten, and a manifest
+    records every part and every ingested workbook.
+
+    Parameters
+    ----------
+    root: str
+        Directory of the dataset. Defaults to "data/admissions-store".
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = Path(root)
+        self.manifest_path = self.root / "manifest.json"
+
+    def __repr__(self):
+        return f"AdmissionStore({str(self.root)!r}, sources={self.sources()})"
+
+    ## ---- Manifest -----------------------------------------------------------
+
+    def manifest(self):
+        """The manifest: sources and their keys, part files and workbooks."""
+
+        if not self.manifest_path.exists():
+            return {"sources": {}, "parts": [], "workbooks": []}
+
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        """Replace the manifest atomically, so readers never see half of it."""
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2, default=str)
+        os.replace(tmp, self.manifest_path)
+
+    def sources(self):
+        """Names of the stored sources."""
+
+        return sorted(self.manifest()["sources"])
+
+    ## ---- Writing ------------------------------------------------------------
+
+    def append(
+        self,
+        data,
+        source,
+        time="time",
+        keys=None,
+        date_format="%B %Y",
+        frequency="M",
+    ):
+        """
+        Append the rows of an export that are not stored yet.
+
+        Parameters
+        ----------
+        data: DataFrame
+            Long admissions of one source, e.g. the typed morbidity table
+            returned by `apply_schema()`. A "year" variable is replaced by
+            the year partition.
+
+        source: str
+            Name of the source, e.g. "morbidity" or "amn".
+
+        time: str
+            The time variable: labels in `date_format`, dates or periods.
+            It is stored as periods of `frequency`.
+
+        keys: list of str
+            Variables identifying a row. Rows whose keys are already stored
+            are skipped, so a full re-export only adds its new periods.
+            Defaults to those of "province", "disease" and `time` present
+            in `data`; later appends reuse the keys of the source.
+
+        The first append records the schema of the source in the manifest,
+        with counts widened to Int64; later exports are cast to it.
+
+        Returns
+        The number of appended rows.
+        """
+
+        manifest = self.manifest()
+        settings = manifest["sources"].get(source)
+        if settings is None:
+            keys = list(keys or [c for c in KEY_CANDIDATES[:-1] if c in data] + [time])
+            settings = {"time": time, "keys": keys, "frequency": frequency}
+        elif settings["time"] != time or settings["frequency"] != frequency:
+            raise ValueError(
+                f"Source {source!r} is stored with time {settings['time']!r} "
+                f"at frequency {settings['frequency']!r}."
+            )
+
+        with stage("store"):
+            ## Periods and year partition of every row ----
+            codes = encode_periods(data[time], date_format, frequency)
+            if (codes == NAT_CODE).any():
+                raise ValueError(f"Rows with missing {time!r} cannot be stored.")
+
+            rows = data.drop(columns="year", errors="ignore").assign(
+                **{time: decode_periods(codes, frequency)}
+            )
+            rows.index = pd.RangeIndex(len(rows))
+
+            ## Skip rows already stored ----
+            if source in manifest["sources"]:
+                stored = self.read(source, columns=settings["keys"])
+                new = ~pd.MultiIndex.from_frame(rows[settings["keys"]]).isin(
+                    pd.MultiIndex.from_frame(stored[settings["keys"]])
+                )
+                rows = rows[new]
+
+            if rows.empty:
+                return 0
+
+            ## One new part file per year ----
+            years = rows[time].dt.year
+            appended = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+            schema = settings.get("schema")
+            schema = None if schema is None else _decode_schema(schema)
+
+            for year, part in rows.groupby(years.to_numpy(), sort=True):
+                directory = self.root / f"source={source}" / f"year={year}"
+                directory.mkdir(parents=True, exist_ok=True)
+                file = directory / f"part-{len(manifest['parts']):05d}.parquet"
+
+                table = _storage_table(part, schema)
+                if schema is None:
+                    schema = table.schema
+                    settings["schema"] = _encode_schema(schema)
+
+                pq.write_table(table, file)
+                manifest["parts"].append(
+                    {
+                        "source": source,
+                        "year": int(year),
+                        "file": str(file.relative_to(self.root)),
+                        "rows": len(part),
+                        "appended": appended,
+                    }
+                )
+
+        manifest["sources"][source] = settings
+        self._write_manifest(manifest)
+
+        return len(rows)
+
+    def ingest_excel(self, path, source, wrangle, **kwargs):
+        """
+        Append a workbook export unless this version of it was ingested
+        before, in which case the workbook is not read at all.
+
+        Parameters
+        ----------
+        path: str
+            Location of the workbook.
+
+        source: str
+            Name of the source the workbook feeds.
+
+        wrangle: callable
+            Turns the raw sheet into long admissions, e.g. renaming, melting
+            and `apply_schema()`.
+
+        **kwargs: Further arguments of `read_excel_cached()`, then of
+        `append()` when named `time`, `keys`, `date_format` or `frequency`.
+
+        Returns
+        The number of appended rows, 0 for a known workbook.
+        """
+
+        from modules.ingest import read_excel_cached
+
+        append_kwargs = {
+            name: kwargs.pop(name)
+            for name in ("time", "keys", "date_format", "frequency")
+            if name in kwargs
+        }
+
+        if self.is_ingested(path, source):
+            return 0
+
+        appended = self.append(
+            wrangle(read_excel_cached(path, **kwargs)), source, **append_kwargs
+        )
+        self.record_workbook(path, source, appended)
+
+        return appended
+
+    def _workbook(self, path, source):
+        """Identity of a workbook version: absolute path, mtime and size."""
+
+        stat = os.stat(path)
+        return {
+            "path": str(Path(path).resolve()),
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "source": source,
+        }
+
+    def is_ingested(self, path, source):
+        """Whether this version of the workbook was already appended."""
+
+        workbook = self._workbook(path, source)
+        return any(
+            {k: w.get(k) for k in workbook} == workbook
+            for w in self.manifest()["workbooks"]
+        )
+
+    def record_workbook(self, path, source, rows):
+        """Record in the manifest that a workbook version was appended."""
+
+        manifest = self.manifest()
+        manifest["workbooks"].append({**self._workbook(path, source), "rows": rows})
+        self._write_manifest(manifest)
+
+    ## ---- Reading ------------------------------------------------------------
+
+    def read(
+        self,
+        source,
+        years=None,
+        provinces=None,
+        diseases=None,
+        columns=None,
+    ):
+        """
+        Read admissions of a source, loading only the partitions and rows
+        passing the filters.
+
+        Parameters
+        ----------
+        source: str
+            Name of the source.
+
+        years, provinces, diseases: list
+            Values to keep. Year filters prune whole partitions; province and
+            disease filters are pushed down to the Parquet row groups. None
+            keeps everything.
+
+        columns: list of str
+            Variables to load. Defaults to all, with "year" last.
+
+        Returns
+        A DataFrame of the matching rows, in time order.
+        """
+
+        directory = self.root / f"source={source}"
+        if not directory.exists():
+            raise KeyError(f"Unknown source: {source!r}")
+
+        ### One schema for all parts, whatever types each export had ----
+        settings = self.manifest()["sources"].get(source, {})
+        schema = settings.get("schema")
+        if schema is not None:
+            schema = _decode_schema(schema)
+            schema = schema.append(YEAR_FIELD).with_metadata(schema.metadata)
+
+        dataset = ds.dataset(
+            directory,
+            schema=schema,
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([YEAR_FIELD]), flavor="hive"),
+        )
+
+        condition = None
+        for name, values in (("year", years), ("province", provinces), ("disease", diseases)):
+            if values is None:
+                continue
+            if name not in dataset.schema.names:
+                raise ValueError(f"Source {source!r} has no {name!r} variable.")
+            if isinstance(values, (str, int)):
+                values = [values]
+            test = ds.field(name).isin(list(values))
+            condition = test if condition is None else condition & test
+
+        with stage("store"):
+            data = dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+        ### Parts of one year may hold any period; restore time order ----
+        time = settings.get("time")
+        if time in data:
+            data = data.sort_values(time, kind="stable", ignore_index=True)
+
+        return data
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+#                  SETTINGS OF THE SUPPORTED TIME FREQUENCIES
+# ==============================================================================
+
+## Format of the time labels written for each frequency ----
+DATE_FORMATS = {"M": "%B %Y", "W": "%Y-%m-%d", "D": "%Y-%m-%d"}
+
+## Seasonal period(s) (cycle lengths) of each frequency; daily data carry
+## weekly as well as yearly cycles ----
+PERIODS = {"M": 12, "W": 52, "D": (7, 365)}
+
+## Periods per year, used to scale the yearly cycle ----
+PERIODS_PER_YEAR = {"M": 12, "W": 52.18, "D": 365.25}
+
+
+# ==============================================================================
+#                FUNCTION TO GENERATE A SYNTHETIC ADMISSIONS PANEL
+# ==============================================================================
+
+
+def generate_admissions_panel(
+    n_units=34,
+    diseases=("ARI", "AWD", "Measles", "Pneumonia"),
+    years=4,
+    frequency="M",
+    start_year=2021,
+    zero_rate=0.01,
+    nan_rate=0.01,
+    seed=0,
+):
+    """
+    Generate a long admissions panel shaped like the melted morbidity data,
+    with a yearly cycle, a trend, noise, and injected zeros and NaNs.
+
+    Parameters
+
+    ----------
+    n_units: int
+    Number of analysis units, e.g. 34 provinces or ~400 districts.
+
+    diseases: tuple of str
+    Diseases to generate a series for in every unit.
+
+    years: int
+    Length of each series in years.
+
+    frequency: str
+    "M", "W" or "D" for monthly, weekly or daily admissions.
+
+    start_year: int
+    First year of the series.
+
+    zero_rate, nan_rate: float
+    Share of values replaced by 0 and by NaN. The first period of each series
+    is left untouched so that the ffill fallback can always recover.
+
+    seed: int
+    Seed of the random generator.
+
+    Returns
+    A DataFrame with "disease", "province", "time" and "admission" columns, the
+    time labels being formatted with `DATE_FORMATS[frequency]`.
+    """
+
+    if frequency not in DATE_FORMATS:
+        raise ValueError("frequency must be 'M', 'W' or 'D'")
+
+    rng = np.random.default_rng(seed)
+
+    ## Time axis and labels ----
+    times = pd.period_range(
+        f"{start_year}-01-01", f"{start_year + years - 1}-12-31", freq=frequency
+    )
+    labels = times.to_timestamp().strftime(DATE_FORMATS[frequency])
+    n_time = len(times)
+    n_series = n_units * len(diseases)
+
+    ## Level, trend, yearly and (daily data) weekly cycles per series ----
+    t = np.arange(n_time)
+    level = rng.lognormal(mean=5, sigma=1, size=(n_series, 1))
+    slope = rng.normal(0, 0.002, size=(n_series, 1))
+    phase = rng.uniform(0, 2 * np.pi, size=(n_series, 1))
+    amplitude = rng.uniform(0.1, 0.5, size=(n_series, 1))
+
+    cycle = 1 + amplitude * np.sin(2 * np.pi * t / PERIODS_PER_YEAR[frequency] + phase)
+    if frequency == "D":
+        cycle = cycle * (1 + 0.1 * np.sin(2 * np.pi * t / 7))
+
+    mean = level * cycle * np.exp(slope * t)
+    values = rng.poisson(mean).astype("float64") + 1
+
+    ## Inject zeros and NaNs, sparing the first period ----
+    zeros = rng.random(values.shape) < zero_rate
+    nans = rng.random(values.shape) < nan_rate
+    zeros[:, 0] = nans[:, 0] = False
+    values[zeros] = 0
+    values[nans] = np.nan
+
+    ## Long layout: one row per disease, unit and period ----
+    units = np.array([f"Unit {i + 1:03d}" for i in range(n_units)])
+
+    return pd.DataFrame(
+        {
+            "disease": np.repeat(np.repeat(list(diseases), n_units), n_time),
+            "province": np.repeat(np.tile(units, len(diseases)), n_time),
+            "time": np.tile(labels, n_series),
+            "admission": values.ravel(),
+        }
+    )
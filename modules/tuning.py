@@ -0,0 +1,193 @@
+from functools import partial
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from modules.decompose_disease import (
+    _fit_batch,
+    _preflight_units,
+    _prepare_unit,
+    _resolve_period,
+    map_units,
+    split_panel,
+)
+from modules.instrument import stage
+
+# ==============================================================================
+#                   RESIDUAL CRITERION OF A DECOMPOSITION
+# ==============================================================================
+
+
+def ljung_box(resid, lags):
+    """
+    Ljung-Box Q statistic of every row of a (units, times) array of
+    remainders. Lower values mean a whiter remainder, i.e. trend and
+    seasonality left less structure behind.
+    """
+
+    x = resid - resid.mean(axis=1, keepdims=True)
+    n = x.shape[1]
+    k = np.arange(1, lags + 1)
+
+    acf = np.stack([(x[:, j:] * x[:, :-j]).sum(axis=1) for j in k], axis=1)
+    acf /= (x**2).sum(axis=1)[:, None]
+
+    return n * (n + 2) * (acf**2 / (n - k)).sum(axis=1)
+
+
+# ==============================================================================
+#               FUNCTION TO SCORE ONE GRID POINT ACROSS ALL UNITS
+# ==============================================================================
+
+
+def _score_grid_point(point, matrices, period, lags):
+    """
+    Ljung-Box Q of every unit decomposed with one `(seasonal, trend, robust)`
+    setting; runs in a worker. `matrices` hold the (Box-Cox-scale) series of
+    units sharing a time index. Settings invalid for the series score NaN.
+    """
+
+    seasonal, trend, robust = point
+    scores = []
+
+    for values in matrices:
+        try:
+            fit = _fit_batch(values, seasonal, period, trend=trend, robust=robust)
+            scores.append(ljung_box(fit["resid"], lags))
+        except ValueError:
+            scores.append(np.full(len(values), np.nan))
+
+    return np.concatenate(scores)
+
+
+# ==============================================================================
+#           FUNCTION TO TUNE STL SETTINGS OF EVERY ANALYSIS UNIT
+# ==============================================================================
+
+
+def tune_stl(
+    data,
+    decompose="admission",
+    seasonal=(7, 9, 11, 13, 15),
+    trend=(None,),
+    robust=(False, True),
+    period=None,
+    frequency="M",
+    lags=None,
+    n_jobs=1,
+    return_report=False,
+):
+    """
+    Pick the STL smoother lengths and robustness of every analysis unit that
+    leave the whitest remainder.
+
+    Each unit passes the pre-flight checks and is Box-Cox-transformed once,
+    as in `apply_stl_decomposition()`, and all units sharing a time index are decomposed together at
+    every grid point with the vectorized engine of `modules.batch_stl`.
+
+    Parameters
+    ----------
+    data: DataFrame or dict
+        A panel in the layout of `summarise_by_unit()`, e.g. from
+        `AdmissionCube.to_panel()`, or a dictionary of analysis unit to its
+        time-series DataFrame.
+
+    decompose: str
+        A variable name holding the phenomenon to be decomposed.
+
+    seasonal, trend, robust: sequence
+        Values of the grid: seasonal smoother lengths, trend smoother lengths
+        (None for the default derived from `seasonal`) and robust flags.
+
+    period: int or sequence of int
+        Periodicity of the series. None uses the periods of `frequency`.
+
+    lags: int
+        Lags of the Ljung-Box criterion. Defaults to twice the (longest)
+        period, at most a fifth of the series length.
+
+    n_jobs: int
+        Number of worker processes scoring grid points.
+
+    return_report: bool
+        Whether to also return the pre-flight report of `validate_panel()`.
+
+    Returns
+    A `(params, scores)` tuple: analysis unit to its best settings, ready for
+    `apply_stl_decomposition(params=...)`, and a DataFrame of the Ljung-Box
+    Q and p-value of every unit and grid point. Units skipped by the
+    pre-flight checks are left out. With `return_report`, a
+    `(params, scores, report)` tuple.
+    """
+
+    period = _resolve_period(period, frequency)
+    by_unit = data if isinstance(data, dict) else split_panel(data)
+
+    with stage("tune"):
+
+        ## Pre-flight checks, as before the decomposition itself ----
+        repaired, report = _preflight_units(
+            by_unit,
+            decompose,
+            period,
+            frequency,
+            panel=None if isinstance(data, dict) else data,
+        )
+        units = list(repaired)
+        if not units:
+            raise ValueError("No unit passes the pre-flight checks.")
+
+        ## Box-Cox decision of every unit, reused at every grid point ----
+        prepared = [
+            _prepare_unit((unit, ts.copy()), decompose)[0] for unit, ts in repaired.items()
+        ]
+
+        ### Units sharing a time index are stacked into one matrix ----
+        groups = {}
+        for i, endog in enumerate(prepared):
+            groups.setdefault(endog.index.to_numpy().tobytes(), []).append(i)
+        order = [i for members in groups.values() for i in members]
+        matrices = [
+            np.vstack([prepared[i].to_numpy(dtype="float64") for i in members])
+            for members in groups.values()
+        ]
+
+        n = min(len(endog) for endog in prepared)
+        if lags is None:
+            lags = max(1, min(2 * int(np.max(period)), n // 5))
+
+        ## Score the grid, one grid point per task ----
+        grid = list(product(seasonal, trend, robust))
+        score_point = partial(_score_grid_point, matrices=matrices, period=period, lags=lags)
+        q = np.empty((len(grid), len(units)))
+        q[:, order] = np.vstack(map_units(score_point, grid, n_jobs))
+
+    from scipy.stats import chi2
+
+    scores = pd.DataFrame(
+        {
+            "unit": np.tile(pd.Index(units, tupleize_cols=False), len(grid)),
+            "seasonal": np.repeat([point[0] for point in grid], len(units)),
+            "trend": np.repeat(np.array([point[1] for point in grid], dtype=object), len(units)),
+            "robust": np.repeat([point[2] for point in grid], len(units)),
+            "q": q.ravel(),
+            "pvalue": chi2.sf(q.ravel(), lags),
+        }
+    )
+
+    ## Best grid point of every unit ----
+    if np.isnan(q).all(axis=0).any():
+        raise ValueError("No grid point is valid for some units; check seasonal and trend.")
+    best = np.nanargmin(q, axis=0)
+
+    params = {
+        unit: {
+            "seasonal": int(grid[b][0]),
+            "trend": None if grid[b][1] is None else int(grid[b][1]),
+            "robust": bool(grid[b][2]),
+        }
+        for unit, b in zip(units, best)
+    }
+
+    return (params, scores, report) if return_report else (params, scores)
@@ -7,6 +7,14 @@
 
 import pandas as pd
 import modules.decompose_disease as dec
+from modules.ingest import SOURCES, load_sources
+from modules.schema import DISEASE_LABELS
+from modules.store import AdmissionStore
+import modules.render as render
+import modules.risk as risk
+import modules.bootstrap as bootstrap
+import modules.tuning as tuning
+from modules.cube import AdmissionCube
 import importlib
 from statsmodels.tsa.seasonal import STL
 import sys
@@ -17,232 +25,323 @@ import matplotlib.pyplot as plt
 plt.style.use("ggplot")
 
 
-## ---- Wrangle ----------------------------------------------------------------
-
-
-### Read in disease admission. Extension is .xls, != engine to be used ----
-ts_diseases = pd.read_excel(
-    "data-raw/afg-morbidity-admission-2021-2025.xls",
-    sheet_name=0,
-    index_col=None,
-    parse_dates=False,
-    header=0
-)
-
-### Rename and exclude non-disease-related values and year 2025 ----
-ts = (
-    ts_diseases.rename(columns={"OPD morbidity": "disease", "Province ": "province"})
-    .melt(id_vars=["disease", "province"], var_name="time", value_name="admission")
-    .query("disease != 'HMIS-MIAR-OPD- New Patients/Clients'")
-    .query("~`time`.str.contains('2025')")
-)
-
-### Recode diseases for easy manipulation ----
-ts["disease"] = ts["disease"].replace(
-    {
-        "HMIS-MIAR-OPD- New Acute Watery Diarrhea": "AWD",
-        "HMIS-MIAR-OPD- New Cough and Cold (ARI)": "ARI",
-        "HMIS-MIAR-OPD- New Measles": "Measles",
-        "HMIS-MIAR-OPD- New Malaria": "Malaria",
-        "HMIS-MIAR-OPD- New Pneumonia (ARI)": "New Pneumonia"
-    }
-)
+def main():
+    ## ---- Wrangle ------------------------------------------------------------
+
+
+    ### Ingest new exports of every source concurrently; known ones are not read ----
+    store = AdmissionStore()
+    _, load_times = load_sources(SOURCES, n_jobs=-1, store=store)
+    print(load_times)
+
+    ### Read diseases of years 2021-2024, excluding non-disease-related values ----
+    ts = store.read(
+        "morbidity",
+        years=range(2021, 2025),
+        diseases=list(DISEASE_LABELS.values()),
+        columns=["disease", "province", "time", "admission"]
+    )
+
+
+    ### Check for missing values ----
+    dec.check_missing_values(ts)
+
+    ### Exclude malaria for many missing values across months and years ----
+    ts.query("`disease` != 'Malaria'", inplace=True)
+
+    ### Check for missing values ----
+    dec.check_missing_values(ts)
+
+    ### Apply univariate NOCB imputation for missing values ----
+    ts, imputed = dec.impute_panel(
+        ts, value="admission", by=["province", "disease"], method="bfill"
+    )
+
+    ### Sum admissions over (time, province, disease) once ----
+    cube = AdmissionCube.from_frame(ts, date_format="%B %Y", frequency="M")
+
+    ### National totals of every disease, rolled up from the cube ----
+    national = cube.rollup(province="National")
 
 
-### Check for missing values ----
-dec.check_missing_values(ts)
+    ## ---- ARI Decomposition --------------------------------------------------
 
-### Exclude malaria for many missing values across months and years ----
-ts.query("`disease` != 'Malaria'", inplace=True)
 
-### Check for missing values ----
-dec.check_missing_values(ts)
+    ### Make a time-series object and plot ----
+    plot_ari_ts = (
+        national.sel(diseases="ARI")
+        .to_panel(by=())
+        .pipe(
+            dec.create_time_plot, 
+            start="Jan 2021", end="Dec 2024", disease="ARI", time="M"
+        )
+    )
+
+    ### Decompose, keeping the pre-flight report of every province ---- 
+    dec_ari, preflight_ari = dec.apply_stl_decomposition(
+        data=cube.sel(diseases="ARI").to_panel(by="province"),
+        decompose="admission",
+        index="time",
+        seasonal=7,
+        period=12,
+        scope="multiple",
+        date_format="%B %Y",
+        frequency="M",
+        analysis_unit="province",
+        summarised=True,
+        return_report=True
+    )
+
+    ### Provinces imputed or skipped before decomposition ----
+    print(preflight_ari.query("strategy != 'ok'"))
 
-### Apply univariate NOCB imputation for missing values ----
-dfs = []
-provinces = ts.province.unique()
+    ### Plot decomposed components ----
+    plt.clf()
+    plt.rcParams["figure.figsize"] = (12, 6.5)
+    dec_ari.plot()
 
-for province in provinces:
-    subset = ts.query("`province` == @province")
+    ### Plot seasonal componet by year ----
+    dec.plot_seasonal_subseries(dec_ari, disease_name="ARI")
 
-    diseases = ts.disease.unique()
-    for disease in diseases:
-        subset_disease = subset.query("`disease` == @disease")
-        x = subset_disease.isnull().values.any()
 
-        if x:
-            p = subset_disease.bfill()
-            dfs.append(p)
-        else:
-            dfs.append(subset_disease)
+    ## ---- AWD Decomposition --------------------------------------------------
 
-# Combine everything into one long DataFrame
-ts = pd.concat(dfs, ignore_index=True)
-del [dfs, x, disease, provinces, diseases, subset, subset_disease, p, province]
 
-### Split disease-specific time seris ----
-ari = ts.query("disease == 'ARI'")
-awd = ts.query("disease == 'AWD'")
-measles = ts.query("disease == 'Measles'")
-pneumonia = ts.query("disease == 'New Pneumonia'")
+    ### Make a time-series object and plot for inspection ----
+    plot_awd_ts = (
+        national.sel(diseases="AWD")
+        .to_panel(by=())
+        .pipe(
+            dec.create_time_plot, 
+            start="Jan 2021", 
+            end="Dec 2024", 
+            disease="AWD", 
+            time="M"
+        )
+    )
+
+    ### Decompose ---- 
+    dec_awd = dec.apply_stl_decomposition(
+        data=national.sel(diseases="AWD").to_panel(by=()),
+        decompose="admission",
+        index="time",
+        seasonal=7,
+        period=12,
+        scope="single",
+        date_format="%B %Y",
+        frequency="M",
+        analysis_unit="",
+        summarised=True
+    )
 
+    ### Plot decomposed components ----
+    plt.clf()
+    plt.rcParams["figure.figsize"] = (12, 6.5)
+    dec_awd.plot()
 
-## ---- ARI Decomposition ------------------------------------------------------
+    ### Plot seasonal componet by year ----
+    dec.plot_seasonal_subseries(dec_awd, disease_name="AWD")
 
 
-### Make a time-series object and plot ----
-plot_ari_ts = (
-    ari
-    .pipe(
-        dec.summarise_disease, 
-        ts_index="time", date_format="%B %Y", time_period="M"
+    ## ---- Measles Decomposition ----------------------------------------------
+
+
+    ### Make a time-series object and plot for inspection ----
+    plot_measles_ts = (
+        national.sel(diseases="Measles")
+        .to_panel(by=())
+        .pipe(
+            dec.create_time_plot,
+            start="Jan 2021", end="Dec 2024", disease="ARI", time="M"
+        )
+    )
+
+    ### Decompose ---- 
+    dec_measles = dec.apply_stl_decomposition(
+        data=national.sel(diseases="Measles").to_panel(by=()),
+        decompose="admission",
+        index="time",
+        seasonal=7,
+        period=12,
+        scope="single",
+        date_format="%B %Y",
+        frequency="M",
+        analysis_unit="",
+        summarised=True
     )
-    .pipe(
-        dec.create_time_plot, 
-        start="Jan 2021", end="Dec 2024", disease="ARI", time="M"
+
+    ### Plot decomposed components ----
+    plt.clf()
+    plt.rcParams["figure.figsize"] = (12, 6.5)
+    dec_measles.plot()
+
+    ### Plot seasonal componet by year ----
+    dec.plot_seasonal_subseries(dec_measles, disease_name="Measles")
+
+
+    ## ---- Pneumonia Decomposition --------------------------------------------
+
+
+    ### Make a time-series object and plot for inspection ----
+    plot_pneummonia_ts = (
+        national.sel(diseases="New Pneumonia")
+        .to_panel(by=())
+        .pipe(
+            dec.create_time_plot,
+            start="Jan 2021", end="Dec 2024", disease="Pneumonia", time="M"
+        )
     )
-)
-
-### Decompose ---- 
-dec_ari = dec.apply_stl_decomposition(
-    data=ari,
-    decompose="admission",
-    index="time",
-    seasonal=7,
-    period=12,
-    scope="multiple",
-    date_format="%B %Y",
-    frequency="M",
-    analysis_unit="province"
-)
-
-### Plot decomposed components ----
-plt.clf()
-plt.rcParams["figure.figsize"] = (12, 6.5)
-dec_ari.plot()
-
-### Plot seasonal componet by year ----
-dec.plot_seasonal_subseries(dec_ari, disease_name="ARI")
-
-
-## ---- AWD Decomposition ------------------------------------------------------
-
-
-### Make a time-series object and plot for inspection ----
-plot_awd_ts = (
-    awd
-    .pipe(
-        dec.summarise_disease, 
-        ts_index="time", 
-        date_format="%B %Y", 
-        time_period="M"
+
+    ### Decompose ---- 
+    dec_pneumonia = dec.apply_stl_decomposition(
+        data=national.sel(diseases="New Pneumonia").to_panel(by=()),
+        decompose="admission",
+        index="time",
+        seasonal=7,
+        period=12,
+        scope="single",
+        date_format="%B %Y",
+        frequency="M",
+        analysis_unit="",
+        summarised=True
     )
-    .pipe(
-        dec.create_time_plot, 
-        start="Jan 2021", 
-        end="Dec 2024", 
-        disease="AWD", 
-        time="M"
+
+
+    ### Plot decomposed components ----
+    plt.clf()
+    plt.rcParams["figure.figsize"] = (12, 6.5)
+    dec_pneumonia.plot()
+
+    ### Plot seasonal componet by year ----
+    dec.plot_seasonal_subseries(dec_pneumonia, disease_name="Pneumonia")
+
+
+    ## ---- Batch report of every province and disease -------------------------
+
+
+    ### Tune smoother lengths and robustness of every province of each disease ----
+    tuned = {
+        disease: tuning.tune_stl(
+            cube.sel(diseases=disease).to_panel(by="province"),
+            decompose="admission",
+            seasonal=(7, 9, 11, 13, 15),
+            trend=(None, 23, 31),
+            robust=(False, True),
+            period=12,
+            n_jobs=-1
+        )[0]
+        for disease in ["ARI", "AWD", "Measles", "New Pneumonia"]
+    }
+
+    ### Decompose every province of each disease with its tuned settings ----
+    dec_by_disease = {
+        disease: dec.apply_stl_decomposition(
+            data=cube.sel(diseases=disease).to_panel(by="province"),
+            decompose="admission",
+            index="time",
+            seasonal=7,
+            period=12,
+            scope="multiple",
+            date_format="%B %Y",
+            frequency="M",
+            analysis_unit="province",
+            n_jobs=-1,
+            summarised=True,
+            params=params
+        )
+        for disease, params in tuned.items()
+    }
+
+    ### Render seasonal subseries headlessly: PNGs per province and disease ----
+    render.render_batch(
+        {
+            (province, disease): decomposed
+            for disease, results in dec_by_disease.items()
+            for province, decomposed in results.items()
+        },
+        kind="subseries",
+        output_dir="output/seasonal-subseries",
+        n_jobs=-1
     )
-)
-
-### Decompose ---- 
-dec_awd = dec.apply_stl_decomposition(
-    data=awd,
-    decompose="admission",
-    index="time",
-    seasonal=7,
-    period=12,
-    scope="single",
-    date_format="%B %Y",
-    frequency="M",
-    analysis_unit=""
-)
-
-### Plot decomposed components ----
-plt.clf()
-plt.rcParams["figure.figsize"] = (12, 6.5)
-dec_awd.plot()
-
-### Plot seasonal componet by year ----
-dec.plot_seasonal_subseries(dec_awd, disease_name="AWD")
-
-
-## ---- Measles Decomposition --------------------------------------------------
-
-
-### Make a time-series object and plot for inspection ----
-plot_measles_ts = (
-    measles
-    .pipe(
-        dec.summarise_disease,
-        ts_index="time", date_format="%B %Y", time_period="M"
+
+    ### ... and one multi-page PDF per disease ----
+    for disease, results in dec_by_disease.items():
+        render.render_batch(
+            results,
+            kind="subseries",
+            pdf_path=f"output/seasonal-subseries-{disease.replace(' ', '-').lower()}.pdf"
+        )
+
+
+
+    ## ---- Risk scoring -------------------------------------------------------
+
+
+    ### Decompose every province and disease with its tuned settings into a panel,
+    ### keeping the Box-Cox lambdas residuals are scored with ----
+    risk_panel = dec.apply_stl_decomposition(
+        data=cube.sel(diseases=list(tuned)).to_panel(by=("province", "disease")),
+        decompose="admission",
+        index="time",
+        seasonal=7,
+        period=12,
+        scope="multiple",
+        frequency="M",
+        output="panel",
+        n_jobs=-1,
+        summarised=True,
+        params={
+            (province, disease): settings
+            for disease, params in tuned.items()
+            for province, settings in params.items()
+        }
     )
-    .pipe(
-        dec.create_time_plot,
-        start="Jan 2021", end="Dec 2024", disease="ARI", time="M"
+
+    ### Rank the last three months of every province and disease by robust z-score ----
+    alerts = risk.score_risk(
+        risk_panel,
+        window=12,
+        slope_window=6,
+        threshold=2.0,
+        periods=3,
+        unit_name=["province", "disease"]
     )
-)
-
-### Decompose ---- 
-dec_measles = dec.apply_stl_decomposition(
-    data=measles,
-    decompose="admission",
-    index="time",
-    seasonal=7,
-    period=12,
-    scope="single",
-    date_format="%B %Y",
-    frequency="M",
-    analysis_unit=""
-)
-
-### Plot decomposed components ----
-plt.clf()
-plt.rcParams["figure.figsize"] = (12, 6.5)
-dec_measles.plot()
-
-### Plot seasonal componet by year ----
-dec.plot_seasonal_subseries(dec_measles, disease_name="Measles")
-
-
-## ---- Pneumonia Decomposition ------------------------------------------------
-
-
-### Make a time-series object and plot for inspection ----
-plot_pneummonia_ts = (
-    pneumonia
-    .pipe(
-        dec.summarise_disease,
-        ts_index="time", date_format="%B %Y", time_period="M"
+    print(alerts.query("exceed"))
+
+
+
+    ## ---- Uncertainty of ARI trends and seasonality --------------------------
+
+
+    ### Decompose ARI of every province into a panel keeping Box-Cox lambdas ----
+    ari_panel = dec.apply_stl_decomposition(
+        data=cube.sel(diseases="ARI").to_panel(by="province"),
+        decompose="admission",
+        index="time",
+        seasonal=7,
+        period=12,
+        scope="multiple",
+        frequency="M",
+        backend="batch",
+        output="panel",
+        summarised=True
     )
-    .pipe(
-        dec.create_time_plot,
-        start="Jan 2021", end="Dec 2024", disease="Pneumonia", time="M"
+
+    ### 95% bands from 500 moving-block bootstrap replicates per province ----
+    ari_bands = bootstrap.bootstrap_components(
+        ari_panel,
+        seasonal=7,
+        period=12,
+        replicates=500,
+        level=95,
+        seed=2024,
+        n_jobs=-1,
+        unit_name="province"
     )
-)
-
-### Decompose ---- 
-dec_pneumonia = dec.apply_stl_decomposition(
-    data=ari,
-    decompose="admission",
-    index="time",
-    seasonal=7,
-    period=12,
-    scope="single",
-    date_format="%B %Y",
-    frequency="M",
-    analysis_unit=""
-)
-
-
-### Plot decomposed components ----
-plt.clf()
-plt.rcParams["figure.figsize"] = (12, 6.5)
-dec_pneumonia.plot()
-
-### Plot seasonal componet by year ----
-dec.plot_seasonal_subseries(dec_pneumonia, disease_name="Pneumonia")
+
+
+if __name__ == "__main__":
+    main()
 
 
 # ============================== End of Workflow ===============================
\ No newline at end of file
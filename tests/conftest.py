@@ -0,0 +1,76 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.decompose_disease import apply_stl_decomposition, summarise_by_unit
+from modules.synthetic import generate_admissions_panel
+
+
+def left_skewed_panel(units=3, n=48, seed=0):
+    """
+    A panel of monthly series with a long lower tail, whose Box-Cox lambda
+    is well above 1, so that they are decomposed on the Box-Cox scale.
+    """
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    times = pd.period_range("2021-01", periods=n, freq="M").to_timestamp()
+
+    frames = [
+        pd.DataFrame(
+            {
+                "province": f"U{u}",
+                "time": times,
+                "admission": (
+                    200 - np.exp(2 + 0.8 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 0.6, n))
+                ).round(),
+            }
+        )
+        for u in range(units)
+    ]
+
+    return pd.concat(frames).set_index(["province", "time"])
+
+
+def decompose_panel(panel, **kwargs):
+    """Decompose every unit of a summarised panel into a DecompositionPanel."""
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return apply_stl_decomposition(
+            panel,
+            "admission",
+            "time",
+            seasonal=7,
+            period=12,
+            scope="multiple",
+            backend="batch",
+            output="panel",
+            summarised=True,
+            **kwargs,
+        )
+
+
+@pytest.fixture(scope="session")
+def transformed_panel():
+    """Decompositions of units all back-transformed from the Box-Cox scale."""
+
+    panel = decompose_panel(left_skewed_panel())
+    assert panel.transformed.all()
+    return panel
+
+
+@pytest.fixture(scope="session")
+def admissions():
+    """Synthetic long admissions of 6 provinces and 2 diseases over 4 years."""
+
+    return generate_admissions_panel(6, ("ARI", "AWD"), 4)
+
+
+@pytest.fixture(scope="session")
+def unit_panel(admissions):
+    """The synthetic admissions summarised by (province, disease)."""
+
+    return summarise_by_unit(admissions, "time", ["province", "disease"])
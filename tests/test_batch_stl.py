@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from modules.batch_stl import batch_mstl, batch_stl
+
+statsmodels = pytest.importorskip("statsmodels.tsa.seasonal")
+
+## Agreement expected with the statsmodels implementation; robustness
+## iterations compound rounding differences, weights most of all ----
+ATOL = 1e-8
+ROBUST_ATOL = 1e-6
+
+
+def series(n, period, units=4, seed=0):
+    """Positive seasonal series with a spike, one per row."""
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    values = 50 + 0.05 * t + 5 * np.sin(2 * np.pi * t / period) + rng.normal(0, 2, (units, n))
+    values[:, n // 3] += 40
+    return values
+
+
+@pytest.mark.parametrize("robust", [False, True])
+@pytest.mark.parametrize(
+    "n, period, seasonal",
+    [(25, 4, 7), (48, 4, 7), (61, 12, 7), (96, 12, 13), (157, 52, 7), (208, 52, 9)],
+)
+def test_batch_stl_matches_statsmodels(n, period, seasonal, robust):
+    values = series(n, period)
+    fit = batch_stl(values, period, seasonal, robust=robust)
+    atol = ROBUST_ATOL if robust else ATOL
+
+    for i, y in enumerate(values):
+        ref = statsmodels.STL(y, period=period, seasonal=seasonal, robust=robust).fit()
+        for component in ("trend", "seasonal", "resid", "weights"):
+            np.testing.assert_allclose(
+                fit[component][i], getattr(ref, component), atol=atol, err_msg=component
+            )
+
+
+@pytest.mark.parametrize("n, periods", [(105, (4, 12)), (313, (12, 52))])
+def test_batch_mstl_matches_statsmodels(n, periods):
+    values = series(n, periods[0]) + 3 * np.sin(2 * np.pi * np.arange(n) / periods[1])
+    fit = batch_mstl(values, periods)
+
+    for i, y in enumerate(values):
+        ref = statsmodels.MSTL(y, periods=periods).fit()
+        for component in ("trend", "seasonal", "resid"):
+            np.testing.assert_allclose(
+                fit[component][i], getattr(ref, component), atol=ATOL, err_msg=component
+            )
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from modules.bootstrap import bootstrap_components, moving_block_indices
+
+
+def test_moving_block_indices_are_consecutive_blocks():
+    rng = np.random.default_rng(0)
+    positions = moving_block_indices(50, 12, 20, rng)
+
+    assert positions.shape == (20, 50)
+    assert positions.min() >= 0 and positions.max() < 50
+    assert (np.diff(positions[:, :12], axis=1) == 1).all()
+
+
+def test_bands_of_back_transformed_units_cover_every_period(transformed_panel):
+    bands = bootstrap_components(transformed_panel, seasonal=7, period=12, replicates=50, seed=1)
+    trend = bands[bands["component"] == "trend"]
+
+    assert (trend.groupby("unit").size() == len(transformed_panel.times)).all()
+    assert trend[["estimate", "lower", "upper"]].notna().all().all()
+    assert (trend["lower"] <= trend["upper"]).all()
+
+
+def test_bands_do_not_depend_on_workers(transformed_panel):
+    one = bootstrap_components(transformed_panel, 7, 12, replicates=20, seed=3)
+    two = bootstrap_components(transformed_panel, 7, 12, replicates=20, seed=3, n_jobs=2)
+
+    np.testing.assert_allclose(one["lower"], two["lower"])
+
+
+def test_dictionary_of_back_transformed_units_is_rejected(transformed_panel):
+    with pytest.raises(ValueError, match="output='panel'"):
+        bootstrap_components(transformed_panel.to_dict(), 7, 12, replicates=10)
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from modules.forecast import forecast_units
+from modules.panel import DecompositionPanel
+
+
+def linear_panel():
+    """Two untransformed units with a linear trend and no seasonality."""
+
+    times = pd.period_range("2023-01", periods=24, freq="M").to_timestamp()
+    trend = np.vstack([np.arange(24.0) + 10, 2 * np.arange(24.0) + 5])
+    zeros = np.zeros_like(trend)
+    values = np.stack([trend, trend, zeros, zeros], axis=2)
+
+    return DecompositionPanel(values, ["a", "b"], times)
+
+
+def test_drift_forecast_extends_a_linear_trend():
+    tidy = forecast_units(linear_panel(), horizon=3, period=12)
+
+    np.testing.assert_allclose(
+        tidy["forecast"], [34, 35, 36, 53, 55, 57]
+    )
+    assert (tidy["time"].iloc[:3] == pd.to_datetime(["2025-01-01", "2025-02-01", "2025-03-01"])).all()
+
+
+def test_back_transformed_units_share_the_forecast_origin(transformed_panel):
+    tidy = forecast_units(transformed_panel, horizon=2, period=12)
+    first = tidy[tidy["horizon"] == 1]
+
+    assert first["time"].nunique() == 1
+    assert first["time"].iloc[0] == transformed_panel.times[-1] + pd.offsets.MonthBegin()
+    assert tidy[["forecast", "lower", "upper"]].notna().all().all()
@@ -0,0 +1,64 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+## Heavy libraries that must only load when a decomposition needs them ----
+HEAVY = ("scipy", "statsmodels", "matplotlib")
+
+
+def run(*args, timeout=60):
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+
+
+## Modules whose import must stay free of the heavy libraries ----
+LIGHT_MODULES = ("decompose_disease", "forecast", "bootstrap", "risk", "tuning")
+
+## Libraries `--help` must not load at all ----
+CLI_EXCLUDED = ("numpy", "pandas", "pyarrow", *HEAVY)
+
+
+def loaded(code, libraries):
+    """Run `code` in a fresh interpreter and list the `libraries` it loaded."""
+
+    out = run(
+        "-c",
+        f"{code}\nimport sys\n"
+        f"print(sorted({{m.split('.')[0] for m in sys.modules}} & set({libraries!r})))",
+    )
+    assert out.returncode == 0, out.stderr
+    return out.stdout.strip().splitlines()[-1]
+
+
+@pytest.mark.parametrize("module", LIGHT_MODULES)
+def test_modules_import_no_heavy_library(module):
+    assert loaded(f"import modules.{module}", HEAVY) == "[]"
+
+
+def test_cli_help_loads_no_data_library():
+    code = (
+        "import runpy, sys\n"
+        "sys.argv = ['cli', '--help']\n"
+        "try:\n"
+        "    runpy.run_module('modules.cli', run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass"
+    )
+
+    assert loaded(code, CLI_EXCLUDED) == "[]"
+
+
+def test_cli_help_prints_usage():
+    out = run("-m", "modules.cli", "--help")
+
+    assert out.returncode == 0, out.stderr
+    assert "usage:" in out.stdout
@@ -0,0 +1,77 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.decompose_disease import _repair_series, decompose_series
+from modules.incremental import (
+    build_decomposition_state,
+    load_decomposition_state,
+    save_decomposition_state,
+    update_decomposition_state,
+)
+
+UNITS = ["province", "disease"]
+LAST = "December 2024"
+
+
+def build(data):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return build_decomposition_state(data, "admission", "time", 7, 12, UNITS)
+
+
+@pytest.fixture(scope="module")
+def state(admissions):
+    """A state of every unit built without the last month."""
+
+    return build(admissions[admissions["time"] != LAST])
+
+
+def last_month(admissions, unit):
+    rows = admissions[admissions["time"] == LAST]
+    return rows[(rows["province"] == unit[0]) & (rows["disease"] == unit[1])]
+
+
+def test_update_decomposes_only_changed_units(admissions, state, unit_panel):
+    unit = ("Unit 001", "ARI")
+    updated = update_decomposition_state(state, last_month(admissions, unit))
+
+    assert updated["updated"] == [unit]
+    assert all(
+        updated["results"][other] is result
+        for other, result in state["results"].items()
+        if other != unit
+    )
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ts = _repair_series(unit_panel.loc[unit], "admission")
+        expected = decompose_series(ts, "admission", 7, 12)
+    np.testing.assert_allclose(
+        np.asarray(updated["results"][unit].trend), np.asarray(expected.trend)
+    )
+
+    ### Stored rows arriving again change nothing ----
+    again = update_decomposition_state(updated, last_month(admissions, unit))
+    assert again["updated"] == []
+
+
+def test_update_repairs_invalid_months_and_reports_them(admissions, state, tmp_path):
+    unit = ("Unit 003", "ARI")
+    rows = last_month(admissions, unit).assign(admission=0.0)
+    assert state["report"].loc[unit, "strategy"] == "ok"
+
+    updated = update_decomposition_state(state, rows)
+
+    assert unit not in state["imputed"] and unit in updated["imputed"]
+    assert updated["report"].loc[unit, "strategy"] == "impute"
+    assert len(updated["report"]) == len(state["report"])
+    assert updated["results"][unit].observed.iloc[-1] > 0
+
+    path = tmp_path / "state.pkl"
+    save_decomposition_state(updated, path)
+    loaded = load_decomposition_state(path)
+    assert loaded["imputed"] == updated["imputed"]
+    pd.testing.assert_frame_equal(loaded["report"], updated["report"])
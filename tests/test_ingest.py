@@ -0,0 +1,24 @@
+import pandas as pd
+
+from modules.ingest import read_excel_cached
+
+
+def test_several_sheets_are_cached_one_by_one(tmp_path):
+    path = tmp_path / "export.xlsx"
+    sheets = {
+        "ARI": pd.DataFrame({"province": ["a", "b"], "admission": [1, 2]}),
+        "AWD": pd.DataFrame({"province": ["a", "b"], "admission": [3, 4]}),
+    }
+    with pd.ExcelWriter(path) as writer:
+        for name, sheet in sheets.items():
+            sheet.to_excel(writer, sheet_name=name, index=False)
+    cache_dir = tmp_path / "cache"
+
+    for sheet_name in (None, ["ARI", "AWD"]):
+        read = read_excel_cached(path, sheet_name=sheet_name, cache_dir=cache_dir)
+
+        assert list(read) == list(sheets)
+        for name, sheet in sheets.items():
+            pd.testing.assert_frame_equal(read[name], sheet)
+
+    assert len(list(cache_dir.glob("*.parquet"))) == 2
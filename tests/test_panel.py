@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from modules.panel import DecompositionPanel
+
+
+def test_model_scale_keeps_components_lost_to_the_back_transform(transformed_panel):
+    stored = transformed_panel.component("resid").to_numpy()
+    resid = transformed_panel.model_scale("resid")
+
+    assert np.isnan(stored).any()
+    assert not np.isnan(resid).any()
+
+    ### The model-scale components add up to the Box-Cox-scale observations ----
+    parts = sum(transformed_panel.model_scale(c) for c in ("trend", "seasonal", "resid"))
+    np.testing.assert_allclose(parts, transformed_panel.model_scale("observed"))
+
+
+def test_selection_keeps_model_scale_rows(transformed_panel):
+    unit = transformed_panel.units[1]
+    selected = transformed_panel.sel(units=[unit], start="2022-01-01")
+
+    np.testing.assert_array_equal(
+        selected.model_scale("trend")[0],
+        transformed_panel.model_scale("trend")[1, 12:],
+    )
+    assert selected.astype("float32").model.dtype == np.float32
+
+
+def test_unit_columns_split_tuple_units():
+    panel = DecompositionPanel(
+        np.zeros((2, 3, 4)), [("a", "x"), ("b", "y")], np.arange(3)
+    )
+    columns = panel.unit_columns(["province", "disease"], np.array([1, 1, 0]))
+
+    assert list(columns["province"]) == ["b", "b", "a"]
+    assert list(columns["disease"]) == ["y", "y", "x"]
+
+
+def test_model_scale_of_a_panel_without_it_raises(transformed_panel):
+    panel = DecompositionPanel.from_results(transformed_panel.to_dict())
+
+    with pytest.raises(ValueError, match="Box-Cox"):
+        panel.model_scale("trend")
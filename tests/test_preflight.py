@@ -0,0 +1,121 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.decompose_disease import _repair_series, apply_stl_decomposition, validate_panel
+
+
+def daily_panel(n=365):
+    """Two daily units of one year, with weekly and yearly periodicity."""
+
+    rng = np.random.default_rng(0)
+    t = np.arange(n)
+    times = pd.date_range("2023-01-01", periods=n, freq="D")
+    frames = [
+        pd.DataFrame(
+            {
+                "province": name,
+                "time": times,
+                "admission": 50 + 10 * np.sin(2 * np.pi * t / 7) + rng.normal(0, 2, n),
+            }
+        )
+        for name in ("a", "b")
+    ]
+    return pd.concat(frames).set_index(["province", "time"])
+
+
+def broken_panel(unit_panel):
+    """
+    The synthetic panel with a zero first month in one unit, a missing month
+    in another, one unit cut to a year and one constant unit.
+    """
+
+    panel = unit_panel.copy()
+    units = panel.index.droplevel(-1).unique()
+    times = panel.index.get_level_values(-1)
+    unit_of = panel.index.droplevel(-1)
+
+    panel.loc[(unit_of == units[0]) & (times == times.min()), "admission"] = 0
+    panel = panel[~((unit_of == units[1]) & (times == times.unique()[10]))]
+    unit_of = panel.index.droplevel(-1)
+    times = panel.index.get_level_values(-1)
+    panel = panel[~((unit_of == units[2]) & (times >= times.unique()[12]))]
+    panel.loc[panel.index.droplevel(-1) == units[3], "admission"] = 7.0
+
+    return panel, units
+
+
+def test_strategies_of_broken_units(unit_panel):
+    panel, units = broken_panel(unit_panel)
+    report = validate_panel(panel, period=12)
+
+    assert report.loc[units[0], "strategy"] == "impute"
+    assert report.loc[units[0], "leading_invalid"]
+    assert report.loc[units[1], ["gaps", "strategy"]].tolist() == [1, "impute"]
+    assert report.loc[units[2], ["too_short", "strategy"]].tolist() == [True, "skip"]
+    assert report.loc[units[3], ["constant", "strategy"]].tolist() == [True, "skip"]
+
+
+def test_repair_fills_gaps_and_leading_invalid_values(unit_panel):
+    panel, units = broken_panel(unit_panel)
+
+    first = _repair_series(panel.loc[units[0]], "admission")
+    gap = _repair_series(panel.loc[units[1]], "admission")
+
+    assert first["admission"].iloc[0] == first["admission"].iloc[1]
+    assert len(gap) == 48 and gap["admission"].notna().all()
+
+
+def test_broken_units_do_not_stop_a_multiple_run(unit_panel):
+    panel, units = broken_panel(unit_panel)
+
+    with pytest.warns(UserWarning, match="Skipping 2 unit"):
+        results, report = apply_stl_decomposition(
+            panel, "admission", "time", 7, 12, scope="multiple", backend="batch",
+            output="panel", summarised=True, return_report=True,
+        )
+
+    assert set(results.units) == set(units) - {units[2], units[3]}
+    assert results.unit_info().loc[[units[0], units[1]], "imputed"].all()
+
+
+def test_one_year_of_daily_data_is_decomposed_on_its_weekly_period():
+    panel = daily_panel()
+    report = validate_panel(panel, period=(7, 365), frequency="D")
+
+    assert (report["strategy"] == "ok").all()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", UserWarning)
+        results = apply_stl_decomposition(
+            panel, "admission", "time", None, (7, 365), scope="multiple",
+            frequency="D", backend="batch", summarised=True,
+        )
+    assert set(results) == {"a", "b"}
+
+
+def test_a_run_that_skips_every_unit_returns_an_empty_panel(unit_panel):
+    panel = unit_panel.groupby(level=[0, 1]).head(12)
+
+    with pytest.warns(UserWarning, match="Skipping 12 unit"):
+        results = apply_stl_decomposition(
+            panel, "admission", "time", 7, 12, scope="multiple", backend="batch",
+            output="panel", summarised=True,
+        )
+
+    assert len(results.units) == 0
+    assert results.values.shape[0] == 0
+
+
+def test_unsummarised_data_is_decomposed_by_several_columns(admissions, unit_panel):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        results = apply_stl_decomposition(
+            admissions, "admission", "time", 7, 12, scope="multiple",
+            date_format="%B %Y", analysis_unit=["province", "disease"],
+            backend="batch",
+        )
+
+    assert set(results) == set(unit_panel.index.droplevel(-1))
@@ -0,0 +1,40 @@
+import numpy as np
+
+from modules.risk import exceedance_runs, robust_zscores, score_risk, trend_slopes
+
+
+def test_robust_zscores_use_the_preceding_window():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(2, 30))
+    z = robust_zscores(values, window=12)
+
+    baseline = values[1, 8:20]
+    median = np.median(baseline)
+    mad = 1.4826 * np.median(np.abs(baseline - median))
+
+    assert np.isclose(z[1, 20], (values[1, 20] - median) / mad)
+    assert np.isnan(z[:, :6]).all()
+
+
+def test_trend_slopes_of_a_line():
+    slope, relative = trend_slopes(np.arange(20.0)[None, :] * 3 + 100, window=6)
+
+    np.testing.assert_allclose(slope[0, 5:], 3)
+    assert np.isnan(slope[0, :5]).all()
+
+
+def test_exceedance_runs_reset_after_a_miss():
+    runs = exceedance_runs(np.array([[1, 1, 0, 1, 1, 1, 0]], dtype=bool))
+
+    np.testing.assert_array_equal(runs, [[1, 2, 0, 1, 2, 3, 0]])
+
+
+def test_back_transformed_units_are_scored_every_period(transformed_panel):
+    table = score_risk(transformed_panel, periods=12)
+
+    assert len(table) == 12 * len(transformed_panel.units)
+    np.testing.assert_allclose(
+        table.sort_values(["unit", "time"])["resid"].to_numpy(),
+        transformed_panel.model_scale("resid")[:, -12:].ravel(),
+    )
+    assert list(table["rank"]) == list(range(1, len(table) + 1))
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from modules.schema import apply_schema
+from modules.store import AdmissionStore
+
+
+@pytest.fixture
+def typed(admissions):
+    """The synthetic admissions with whole counts, typed by `apply_schema()`."""
+
+    return apply_schema(admissions.assign(admission=admissions["admission"].round()))[0]
+
+
+def test_append_skips_stored_rows(tmp_path, typed):
+    store = AdmissionStore(tmp_path)
+    older = typed[typed["time"] < pd.Period("2023-06", "M")]
+
+    assert store.append(older, "morbidity") == len(older)
+    assert store.append(typed, "morbidity") == len(typed) - len(older)
+    assert store.append(typed, "morbidity") == 0
+    assert len(store.read("morbidity")) == len(typed)
+
+
+def test_narrow_and_wide_exports_read_back_as_one_schema(tmp_path):
+    store = AdmissionStore(tmp_path)
+    narrow = pd.DataFrame(
+        {
+            "province": pd.Categorical(["K", "H"]),
+            "disease": pd.Categorical(["ARI", "ARI"]),
+            "time": ["January 2021", "January 2021"],
+            "admission": pd.array([100, None], dtype="UInt8"),
+        }
+    )
+    wide = pd.DataFrame(
+        {
+            "province": pd.Categorical(["K", "H"]),
+            "disease": pd.Categorical(["ARI", "AWD"]),
+            "time": ["February 2022", "February 2022"],
+            "admission": pd.array([100000, 5], dtype="UInt32"),
+        }
+    )
+    store.append(narrow, "morbidity")
+    store.append(wide, "morbidity")
+
+    data = AdmissionStore(tmp_path).read("morbidity")
+
+    assert str(data["admission"].dtype) == "Int64"
+    assert data["admission"].tolist() == [100, pd.NA, 100000, 5]
+
+
+def test_read_filters_years_provinces_and_diseases(tmp_path, typed):
+    store = AdmissionStore(tmp_path)
+    store.append(typed, "morbidity")
+
+    data = store.read(
+        "morbidity", years=[2021, 2022], provinces="Unit 001", diseases=["ARI"]
+    )
+    expected = typed[
+        (typed["time"].dt.year <= 2022)
+        & (typed["province"] == "Unit 001")
+        & (typed["disease"] == "ARI")
+    ]
+
+    assert len(data) == len(expected) > 0
+    assert set(data["time"].dt.year) == {2021, 2022}
+    assert set(data["province"]) == {"Unit 001"}
+    assert set(data["disease"]) == {"ARI"}
+    assert data["time"].is_monotonic_increasing
+
+
+def test_filter_on_a_missing_variable_raises(tmp_path):
+    store = AdmissionStore(tmp_path)
+    store.append(
+        pd.DataFrame({"province": ["a"], "time": ["January 2021"], "sam": [1]}), "amn"
+    )
+
+    with pytest.raises(ValueError, match="no 'disease'"):
+        store.read("amn", diseases=["ARI"])